@@ -0,0 +1,100 @@
+"""
+Debounced and coalesced ingredient autocomplete
+
+The dropdown fires a callback on every keystroke, typing 'chicken' sends
+seven queries of which only the last matters. Queries reaching the
+spoonacular autocomplete endpoint go through an AutocompleteCoalescer:
+    - a query waits for a short debounce window and is dropped when the
+      same browser has typed a newer one in the meantime, a dropped or
+      late answer is never returned so it can not overwrite a newer one
+    - concurrent identical queries share one upstream request through
+      a SingleFlight
+    - when an answer for a shorter prefix held every match (fewer than
+      the number asked for) the longer query is answered by filtering it
+"""
+
+import threading
+import time
+
+from cache import DEFAULT_TTLS, MemoryBackend
+from singleflight import SingleFlight
+
+
+class Superseded(Exception):
+    """Raised when a newer query from the same browser replaced this one"""
+
+
+class AutocompleteCoalescer(object):
+    """AutocompleteCoalescer
+    --
+    Wraps fetch(query, number), a function returning a spoonacular
+    autocomplete response, see search()
+    """
+
+    def __init__(self, fetch, number=8, debounce=0.15, ttl=DEFAULT_TTLS['autocomplete'],
+                 maxsize=4096):
+        self.fetch = fetch
+        self.number = number
+        self.debounce = debounce
+        self.ttl = ttl
+        # query -> (results, complete)
+        self.answers = MemoryBackend(maxsize)
+        # client id -> latest query number, the expiry is unused
+        self._latest = MemoryBackend(maxsize)
+        # Queries being fetched
+        self.flights = SingleFlight()
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _check(self, client_id, ticket):
+        if client_id is None:
+            return
+        entry = self._latest.get(client_id)
+        if entry is not None and entry[1] != ticket:
+            raise Superseded
+
+    def _cached(self, query):
+        """Return the results for query from a stored answer or None"""
+        entry = self.answers.get(query)
+        if entry is not None and entry[0] >= time.time():
+            return entry[1][0]
+        # A complete answer for a shorter prefix holds every match
+        for end in range(len(query) - 1, 0, -1):
+            entry = self.answers.get(query[:end])
+            if entry is not None and entry[0] >= time.time() and entry[1][1]:
+                return [r for r in entry[1][0] if query in r['name'].lower()]
+        return None
+
+    def _fetch(self, query):
+        """Fetch query and keep its answer"""
+        results = self.fetch(query, self.number)
+        self.answers.set(query, (results, len(results) < self.number),
+                         time.time() + self.ttl)
+        return results
+
+    def search(self, query, client_id=None):
+        """search
+        --
+        return: the autocomplete results for query
+        raises: Superseded when client_id typed a newer query before
+        this one was answered
+        """
+        query = query.strip().lower()
+        with self._lock:
+            self._counter += 1
+            ticket = self._counter
+            if client_id is not None:
+                self._latest.set(client_id, ticket, 0)
+
+        results = self._cached(query)
+        if results is not None:
+            return results
+
+        # Give the browser time to send the next keystroke
+        if self.debounce:
+            time.sleep(self.debounce)
+        self._check(client_id, ticket)
+
+        results = self.flights.do(query, self._fetch, query)
+        self._check(client_id, ticket)
+        return results
@@ -0,0 +1,298 @@
+"""
+Response caching for spoonacular lookups
+
+Results for the same inputs rarely change, so responses are kept in an
+in-process LRU with a time to live per endpoint. An optional SQLite file
+can sit behind the LRU so that every gunicorn worker on a host shares
+the responses any one of them has paid for.
+"""
+
+# We will log to terminal cache problems
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a response stays fresh for each endpoint
+DEFAULT_TTLS = {
+    'autocomplete': 24 * 60 * 60,
+    'findByIngredients': 6 * 60 * 60,
+    'analyzedInstructions': 7 * 24 * 60 * 60,
+    'ingredientInformation': 24 * 60 * 60,
+    'priceBreakdown': 24 * 60 * 60,
+}
+
+# Used when an endpoint has no entry in the ttl table
+FALLBACK_TTL = 60 * 60
+
+# Seconds an expired response stays on disk, for get_stale
+STALE_TTL = 7 * 24 * 60 * 60
+
+# Returned by the cache when it does not hold a fresh value for a key
+MISSING = object()
+
+
+def make_key(endpoint, *parts):
+    """make_key
+    --
+    Build a cache key from an endpoint name and its query parts.
+    Lists and tuples are treated as unordered sets of names so that
+    'Flour, egg' and 'egg,flour' share one entry
+    """
+    normalized = []
+    for part in parts:
+        if isinstance(part, (list, tuple, set)):
+            part = ','.join(sorted({str(p).strip().lower() for p in part}))
+        normalized.append(str(part).strip().lower())
+    return endpoint + ':' + '|'.join(normalized)
+
+
+class MemoryBackend(object):
+    """MemoryBackend
+    --
+    A thread safe least recently used mapping of key to (expires, value)
+    holding at most maxsize entries (None for no limit), expiry is left
+    to the caller
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the (expires, value) entry of key or None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires):
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while self.maxsize is not None and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def items(self):
+        """Return a list of the (key, expires, value) entries"""
+        with self._lock:
+            return [(key, entry[0], entry[1]) for key, entry in self._data.items()]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteConnections(object):
+    """SQLiteConnections
+    --
+    Called to return this thread's connection to the SQLite file at path,
+    opened in WAL mode so readers in other worker processes are not
+    blocked by a writer, options are passed to sqlite3.connect
+    """
+
+    def __init__(self, path, **options):
+        self.path = path
+        self.options = dict({'timeout': 5}, **options)
+        self._local = threading.local()
+
+    def __call__(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, **self.options)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+
+class SQLiteBackend(object):
+    """SQLiteBackend
+    --
+    Stores pickled responses in a SQLite file, each thread uses its own
+    connection (see SQLiteConnections). Entries that expired
+    more than grace seconds ago are deleted by a set, at most once every
+    purge_interval seconds
+    """
+
+    def __init__(self, path, table='cache', grace=0, purge_interval=60):
+        self.path = path
+        self.table = table
+        self.grace = grace
+        self.purge_interval = purge_interval
+        self._purged = 0
+        self._connect = SQLiteConnections(path)
+        conn = self._connect()
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                     '(key TEXT PRIMARY KEY, expires REAL, value BLOB)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_expires ON {table} (expires)')
+        conn.commit()
+
+    def get(self, key):
+        """Return the (expires, value) entry of key or None"""
+        try:
+            row = self._connect().execute(
+                f'SELECT expires, value FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error as err:
+            logging.error(f'Cache read failed: {err}')
+            return None
+        if row is None:
+            return None
+        return row[0], pickle.loads(row[1])
+
+    def set(self, key, value, expires):
+        conn = self._connect()
+        try:
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)',
+                         (key, expires, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+            conn.commit()
+        except sqlite3.Error as err:
+            logging.error(f'Cache write failed: {err}')
+        if time.time() - self._purged >= self.purge_interval:
+            self.purge()
+
+    def purge(self):
+        """Delete the entries that expired more than grace seconds ago
+        return: the number of entries deleted"""
+        self._purged = time.time()
+        conn = self._connect()
+        try:
+            deleted = conn.execute(f'DELETE FROM {self.table} WHERE expires < ?',
+                                   (self._purged - self.grace,)).rowcount
+            conn.commit()
+        except sqlite3.Error as err:
+            logging.error(f'Cache purge failed: {err}')
+            return 0
+        return deleted
+
+    def items(self):
+        """Yield the (key, expires, value) entries"""
+        rows = self._connect().execute(f'SELECT key, expires, value FROM {self.table}')
+        for key, expires, value in rows:
+            yield key, expires, pickle.loads(value)
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute(f'DELETE FROM {self.table}')
+        conn.commit()
+
+    def __len__(self):
+        return self._connect().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+
+class ResponseCache(object):
+    """ResponseCache
+    --
+    The cache placed in front of the spoonacular client, lookups try the
+    in-process LRU first and then the shared disk backend when one is given.
+    Hits and misses are counted per endpoint, see stats()
+    """
+
+    def __init__(self, maxsize=1024, path=None, ttls=None):
+        self.memory = MemoryBackend(maxsize)
+        # Expired responses are kept a while longer for get_stale
+        self.disk = SQLiteBackend(path, grace=STALE_TTL) if path else None
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.hits = {}
+        self.misses = {}
+        # Expired values served by get_stale
+        self.stale = {}
+        self._lock = threading.Lock()
+
+    def _count(self, counter, endpoint):
+        with self._lock:
+            counter[endpoint] = counter.get(endpoint, 0) + 1
+
+    def _lookup(self, key):
+        """Return the (expires, value) entry of key from either tier"""
+        entry = self.memory.get(key)
+        if self.disk is not None and (entry is None or entry[0] < time.time()):
+            # Another worker may have refreshed the shared entry
+            disk_entry = self.disk.get(key)
+            if disk_entry is not None and (entry is None or disk_entry[0] > entry[0]):
+                # Promote to memory keeping the expiry of the disk entry
+                self.memory.set(key, disk_entry[1], disk_entry[0])
+                entry = disk_entry
+        return entry
+
+    def get(self, endpoint, key):
+        """Return the fresh cached value for key or MISSING"""
+        entry = self._lookup(key)
+        if entry is None or entry[0] < time.time():
+            self._count(self.misses, endpoint)
+            return MISSING
+        self._count(self.hits, endpoint)
+        return entry[1]
+
+    def get_stale(self, endpoint, key):
+        """Return the cached value for key even when it has expired,
+        or MISSING, used when a fresh response can not be afforded"""
+        entry = self._lookup(key)
+        if entry is None:
+            return MISSING
+        with self._lock:
+            self.stale[endpoint] = self.stale.get(endpoint, 0) + 1
+        return entry[1]
+
+    def set(self, endpoint, key, value):
+        """Store value under key for the ttl of endpoint"""
+        expires = time.time() + self.ttls.get(endpoint, FALLBACK_TTL)
+        self.memory.set(key, value, expires)
+        if self.disk is not None:
+            self.disk.set(key, value, expires)
+
+    def entries(self):
+        """Return the fresh (key, expires, value) entries of both tiers,
+        the one expiring last when a key is in both"""
+        now = time.time()
+        entries = {}
+        tiers = [self.memory.items()]
+        if self.disk is not None:
+            tiers.append(self.disk.items())
+        for tier in tiers:
+            for key, expires, value in tier:
+                if expires >= now and (key not in entries or entries[key][1] < expires):
+                    entries[key] = (key, expires, value)
+        return list(entries.values())
+
+    def restore(self, entries):
+        """Store (key, expires, value) entries keeping their expiry,
+        expired entries are skipped
+        return: the number of entries stored"""
+        now = time.time()
+        count = 0
+        for key, expires, value in entries:
+            if expires < now:
+                continue
+            self.memory.set(key, value, expires)
+            if self.disk is not None:
+                self.disk.set(key, value, expires)
+            count += 1
+        return count
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        """Return the hit, miss and stale counts and hit rate of every endpoint"""
+        with self._lock:
+            endpoints = set(self.hits) | set(self.misses)
+            stats = {}
+            for endpoint in sorted(endpoints):
+                hits = self.hits.get(endpoint, 0)
+                misses = self.misses.get(endpoint, 0)
+                stats[endpoint] = {'hits': hits, 'misses': misses,
+                                   'hit_rate': hits / (hits + misses),
+                                   'stale': self.stale.get(endpoint, 0)}
+        return stats
+
+    def __len__(self):
+        return len(self.memory)
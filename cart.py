@@ -0,0 +1,163 @@
+"""
+Shopping cart aggregation
+
+The cart is stored as a mapping of ingredient id to a single line so the
+same ingredient saved from two recipes is merged into one line with the
+amounts added together, after converting them to a common unit.
+
+The cart table only needs a total and the name, aisle and cost of each
+line, this is computed in plain Python so pandas does not have to be
+imported by the workers. to_dataframe() is kept for callers that still
+want a DataFrame, pandas is only imported when it is called.
+"""
+
+# Columns shown in the cart table, in order
+COLUMNS = ['name', 'aisle', 'cost']
+
+# Spellings of the units found in spoonacular recipes
+UNIT_ALIASES = {
+    'c': 'cup', 'cups': 'cup',
+    't': 'tsp', 'teaspoon': 'tsp', 'teaspoons': 'tsp', 'tsps': 'tsp',
+    'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'tbsps': 'tbsp', 'tbs': 'tbsp',
+    'milliliter': 'ml', 'milliliters': 'ml', 'millilitres': 'ml',
+    'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l',
+    'fluid ounce': 'fl oz', 'fluid ounces': 'fl oz', 'pints': 'pint',
+    'quarts': 'quart', 'gallons': 'gallon', 'qt': 'quart', 'pt': 'pint',
+    'gram': 'g', 'grams': 'g', 'kilogram': 'kg', 'kilograms': 'kg',
+    'ounce': 'oz', 'ounces': 'oz', 'pound': 'lb', 'pounds': 'lb', 'lbs': 'lb',
+}
+
+# Units that can be converted, as (base unit, size in the base unit)
+UNIT_CONVERSIONS = {
+    'ml': ('ml', 1.0), 'l': ('ml', 1000.0), 'tsp': ('ml', 4.92892),
+    'tbsp': ('ml', 14.7868), 'fl oz': ('ml', 29.5735), 'cup': ('ml', 236.588),
+    'pint': ('ml', 473.176), 'quart': ('ml', 946.353), 'gallon': ('ml', 3785.41),
+    'g': ('g', 1.0), 'kg': ('g', 1000.0), 'oz': ('g', 28.3495), 'lb': ('g', 453.592),
+}
+
+
+def normalize_unit(amount, unit):
+    """normalize_unit
+    --
+    Convert amount to millilitres for volumes and grams for weights,
+    other units (such as 'large' or 'servings') only have their
+    spelling normalized
+    return: the (amount, unit) pair
+    """
+    unit = (unit or '').strip().lower()
+    unit = UNIT_ALIASES.get(unit, unit)
+    if unit in UNIT_CONVERSIONS:
+        base, size = UNIT_CONVERSIONS[unit]
+        return float(amount or 0) * size, base
+    return float(amount or 0), unit
+
+
+def merge_cart(lines, items):
+    """merge_cart
+    --
+    Merge the ingredient items into the cart lines, a mapping of ingredient
+    id (as a string) to line, which is changed in place. Only the items are
+    visited. A merged line that was already priced has its cost scaled by
+    the new amount, an ingredient saved in a unit that cannot be converted
+    to the unit of its line gets a line of its own keyed 'id:unit'.
+    return: the keys of the lines that still need a price
+    """
+    to_price = []
+    for item in items:
+        amount, unit = normalize_unit(item.get('amount'), item.get('unit'))
+        key = str(item['id'])
+        line = lines.get(key)
+        if line is not None and line['unit'] != unit:
+            key = f"{item['id']}:{unit}"
+            line = lines.get(key)
+
+        if line is None:
+            lines[key] = {'name': item['name'], 'id': item['id'], 'aisle': item['aisle'],
+                          'amount': amount, 'unit': unit}
+            if 'cost' in item:
+                lines[key]['cost'] = item['cost']
+            elif key not in to_price:
+                to_price.append(key)
+            continue
+
+        if 'cost' in item and 'cost' in line:
+            line['cost'] += item['cost']
+        elif 'cost' in line and line['amount'] > 0:
+            line['cost'] *= (line['amount'] + amount) / line['amount']
+        elif key not in to_price:
+            line.pop('cost', None)
+            to_price.append(key)
+        line['amount'] += amount
+    return to_price
+
+
+def load_cart(data):
+    """Return the cart lines held in the browser store, carts saved
+    before lines were merged are a list of ingredients"""
+    if not data:
+        return {}
+    if isinstance(data, list):
+        lines = {}
+        merge_cart(lines, data)
+        return lines
+    return data
+
+
+class _At(object):
+    """Label based access to a single cell, cart.at[0, 'name'] or
+    cart.at['Total', 'cost'] like the DataFrame the cart replaced"""
+
+    def __init__(self, cart):
+        self.cart = cart
+
+    def __getitem__(self, key):
+        row, column = key
+        if row == 'Total':
+            return self.cart.total_row[column]
+        return self.cart.rows[row][column]
+
+
+class Cart(object):
+    """Cart
+    --
+    The lines of a cart followed by a Total row, with the cost of
+    each aisle in subtotals
+    """
+
+    columns = COLUMNS
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.subtotals = {}
+        total = 0.0
+        for row in rows:
+            total += row['cost']
+            self.subtotals[row['aisle']] = self.subtotals.get(row['aisle'], 0.0) + row['cost']
+        self.total = total
+        self.total_row = {'name': 'Total', 'aisle': '', 'cost': total}
+        self.at = _At(self)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def to_dict(self, orient='records'):
+        """Return the rows and the Total row as a list of records"""
+        if orient != 'records':
+            raise ValueError(f"Only 'records' orientation is supported, not {orient}")
+        return [dict(row) for row in self.rows] + [dict(self.total_row)]
+
+    def to_dataframe(self):
+        """Return the cart as a pandas DataFrame indexed 0..n and 'Total'"""
+        import pandas as pd
+        return pd.DataFrame(self.to_dict(), columns=COLUMNS,
+                            index=list(range(len(self.rows))) + ['Total'])
+
+
+def make_cart(ingredients):
+    """make_cart
+    --
+    accepts a list of ingredient dictionaries containing name, aisle and cost
+    return: a Cart to be passed into a datatable later
+    """
+    return Cart([{'name': i['name'], 'aisle': i['aisle'], 'cost': i.get('cost', 0.0)}
+                 for i in ingredients])
@@ -0,0 +1,195 @@
+"""
+Local recipe catalog
+
+Every recipe spoonacular returns is kept in a SQLite file with its full
+ingredient list (the used and missed ingredients of a search result) and
+its instructions once they are fetched. Searches are answered from the
+catalog when it holds enough recipes using every ingredient, or when the
+API was already asked for as many recipes of the same ingredients, ranked
+the way findByIngredients ranks them: most used ingredients first, then
+fewest missed. The API is only asked to fill the gaps, and the catalog answers
+what it can while spoonacular is unreachable.
+"""
+
+# We will log to terminal catalog problems
+import logging
+import pickle
+import sqlite3
+import threading
+
+from cache import SQLiteConnections
+from recipes import MissedIngredient, Recipe
+
+
+def name_variants(name):
+    """The names an ingredient may be listed under, 'egg' and 'eggs'"""
+    name = name.strip().lower()
+    variants = {name, name + 's', name + 'es'}
+    if name.endswith('es'):
+        variants.add(name[:-2])
+    if name.endswith('s'):
+        variants.add(name[:-1])
+    return variants
+
+
+def search_key(ingredients):
+    """The ingredients of a search as one normalized string"""
+    return ','.join(sorted({i.strip().lower() for i in ingredients}))
+
+
+def uses_all(recipe, ingredients):
+    """Whether a catalogued recipe uses every ingredient of the search"""
+    return all(name_variants(i) & set(recipe.used_names) for i in ingredients)
+
+
+class RecipeCatalog(object):
+    """RecipeCatalog
+    --
+    A SQLite catalog of recipes, their ingredients and instructions,
+    each thread uses its own connection and the database is opened in
+    WAL mode so every worker on the host can share the file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connect = SQLiteConnections(path)
+        # Searches and instructions answered without the API
+        self.hits = {}
+        self._lock = threading.Lock()
+        conn = self._connect()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS recipes '
+                         '(id INTEGER PRIMARY KEY, title TEXT, image TEXT, '
+                         'ingredient_count INTEGER)')
+            conn.execute('CREATE TABLE IF NOT EXISTS ingredients '
+                         '(recipe_id INTEGER, id INTEGER, name TEXT, aisle TEXT, '
+                         'amount REAL, unit TEXT, image TEXT)')
+            # The inverted index from ingredient name to recipes
+            conn.execute('CREATE INDEX IF NOT EXISTS ingredients_name ON ingredients (name)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ingredients_recipe '
+                         'ON ingredients (recipe_id)')
+            conn.execute('CREATE TABLE IF NOT EXISTS instructions '
+                         '(recipe_id INTEGER PRIMARY KEY, steps BLOB)')
+            # The largest number of recipes fetched from the API by search
+            conn.execute('CREATE TABLE IF NOT EXISTS searches '
+                         '(ingredients TEXT PRIMARY KEY, number INTEGER)')
+
+    def _hit(self, kind):
+        with self._lock:
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+
+    def add_recipes(self, response):
+        """Keep the recipes of a findByIngredients response"""
+        conn = self._connect()
+        try:
+            with conn:
+                for data in response:
+                    ingredients = data.get('usedIngredients', []) + \
+                        data.get('missedIngredients', [])
+                    conn.execute('INSERT OR REPLACE INTO recipes VALUES (?, ?, ?, ?)',
+                                 (data['id'], data['title'], data.get('image'),
+                                  len({n['name'].lower() for n in ingredients})))
+                    conn.execute('DELETE FROM ingredients WHERE recipe_id = ?', (data['id'],))
+                    conn.executemany('INSERT INTO ingredients VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                     [(data['id'], n['id'], n['name'].lower(), n.get('aisle'),
+                                       n['amount'], n['unit'], n.get('image'))
+                                      for n in ingredients])
+        except sqlite3.Error as err:
+            logging.error(f'Catalog write failed: {err}')
+
+    def add_instructions(self, recipe_id, steps):
+        """Keep the analyzed instructions of a recipe"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO instructions VALUES (?, ?)',
+                             (recipe_id, pickle.dumps(steps, pickle.HIGHEST_PROTOCOL)))
+        except sqlite3.Error as err:
+            logging.error(f'Catalog write failed: {err}')
+
+    def add_search(self, ingredients, number):
+        """Keep that the API was asked for number recipes of ingredients"""
+        conn = self._connect()
+        key = search_key(ingredients)
+        try:
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO searches VALUES (?, MAX(?, COALESCE('
+                             '(SELECT number FROM searches WHERE ingredients = ?), 0)))',
+                             (key, number, key))
+        except sqlite3.Error as err:
+            logging.error(f'Catalog write failed: {err}')
+
+    def searched(self, ingredients):
+        """Return the number of recipes the API was asked for ingredients"""
+        try:
+            row = self._connect().execute('SELECT number FROM searches WHERE ingredients = ?',
+                                          (search_key(ingredients),)).fetchone()
+        except sqlite3.Error as err:
+            logging.error(f'Catalog read failed: {err}')
+            return 0
+        return 0 if row is None else row[0]
+
+    def instructions(self, recipe_id):
+        """Return the analyzed instructions of a recipe or None"""
+        try:
+            row = self._connect().execute('SELECT steps FROM instructions WHERE recipe_id = ?',
+                                          (recipe_id,)).fetchone()
+        except sqlite3.Error as err:
+            logging.error(f'Catalog read failed: {err}')
+            return None
+        if row is None:
+            return None
+        self._hit('instructions')
+        return pickle.loads(row[0])
+
+    def search(self, ingredients, number):
+        """search
+        --
+        Find at most number recipes using any of the ingredients
+        return: a list of recipes.Recipe, the used and missed ingredients
+        are those of this search
+        """
+        names = set()
+        for ingredient in ingredients:
+            names |= name_variants(ingredient)
+        if not names:
+            return []
+        marks = ','.join('?' * len(names))
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT r.id, r.title, r.image, COUNT(DISTINCT i.name) AS used, '
+                'r.ingredient_count - COUNT(DISTINCT i.name) AS missed '
+                'FROM ingredients i JOIN recipes r ON r.id = i.recipe_id '
+                f'WHERE i.name IN ({marks}) GROUP BY r.id '
+                'ORDER BY used DESC, missed ASC, r.id LIMIT ?',
+                sorted(names) + [number]).fetchall()
+            ids = [row[0] for row in rows]
+            lines = conn.execute(
+                'SELECT recipe_id, id, name, aisle, amount, unit, image FROM ingredients '
+                f'WHERE recipe_id IN ({",".join("?" * len(ids))}) ORDER BY rowid',
+                ids).fetchall()
+        except sqlite3.Error as err:
+            logging.error(f'Catalog read failed: {err}')
+            return []
+
+        by_recipe = {}
+        for line in lines:
+            by_recipe.setdefault(line[0], []).append(line[1:])
+        recipes = []
+        for recipe_id, title, image, used, missed in rows:
+            used_lines = [n for n in by_recipe.get(recipe_id, []) if n[1] in names]
+            missed_lines = [n for n in by_recipe.get(recipe_id, []) if n[1] not in names]
+            recipes.append(Recipe(recipe_id, title, image,
+                                  [n[5] for n in used_lines],
+                                  [MissedIngredient(n[0], n[1], n[2], n[3], n[4])
+                                   for n in missed_lines],
+                                  len(missed_lines), [n[1] for n in used_lines]))
+        return recipes
+
+    def found(self):
+        """Count a search answered by the catalog"""
+        self._hit('search')
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM recipes').fetchone()[0]
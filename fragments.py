@@ -0,0 +1,66 @@
+"""
+Rendered recipe fragments
+
+The recipe title, ingredient images and steps shown by generate_recipies
+only depend on the recipe and the ingredients it uses from the search.
+They are rendered once as plain dicts in the json form Dash sends for a
+component, {'type': ..., 'namespace': ..., 'props': ...}, which the
+renderer displays like the component itself. Dash serializes plain
+dicts without walking component objects, and a FragmentCache keeps the
+rendered fragments so repeat views of a recipe skip the instructions
+lookup and the build.
+"""
+
+import time
+
+from cache import DEFAULT_TTLS, MemoryBackend
+
+
+def component(type, children=None, namespace='dash_html_components', **props):
+    """The json form of a dash component, as Dash writes it"""
+    props['children'] = children
+    return {'type': type, 'namespace': namespace, 'props': props}
+
+
+def render_recipe(recipe, steps):
+    """render_recipe
+    --
+    recipe: a recipes.Recipe
+    steps: its analyzed instructions
+    return: the title and the ingredients (images and steps) children
+    """
+    ingredients = [component('Img', src=image) for image in recipe.used_images]
+    if len(steps) > 0:
+        ingredients += [component('H5', 'Steps:'),
+                        component('Ol', [component('Li', step['step'])
+                                         for step in steps[0]['steps']])]
+    return {'title': component('H4', recipe.title), 'ingredients': ingredients}
+
+
+class FragmentCache(object):
+    """FragmentCache
+    --
+    Rendered fragments by recipe and used ingredients, kept as long as
+    the instructions they were rendered from
+    """
+
+    def __init__(self, maxsize=512, ttl=DEFAULT_TTLS['analyzedInstructions']):
+        self.fragments = MemoryBackend(maxsize)
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(recipe):
+        return recipe.id, recipe.used_images
+
+    def get(self, recipe):
+        """Return the rendered fragment of recipe or None"""
+        entry = self.fragments.get(self._key(recipe))
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+    def set(self, recipe, fragment):
+        self.fragments.set(self._key(recipe), fragment, time.time() + self.ttl)
+
+    def __len__(self):
+        return len(self.fragments)
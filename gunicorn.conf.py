@@ -0,0 +1,81 @@
+# gunicorn settings for iCook, each can be changed through the environment
+#   $ ICOOK_WORKERS=4 ICOOK_THREADS=16 gunicorn -c gunicorn.conf.py wsgi:application
+import multiprocessing
+import os
+import signal
+import stat
+import tempfile
+from os import environ, path
+
+bind = environ.get("ICOOK_BIND", "0.0.0.0:8050")
+
+# Worker processes, each runs its own copy of the app and caches
+workers = int(environ.get("ICOOK_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+
+
+
+def private_dir(name):
+    """Create the directory name readable only by this user and return it,
+    the files in it are unpickled so one anybody else can write to is refused"""
+    os.makedirs(name, mode=0o700, exist_ok=True)
+    info = os.lstat(name)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() \
+            or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise RuntimeError(f"{name} should be a directory owned by this user that "
+                           "only it can write to, set ICOOK_SHARED_DIR")
+    return name
+
+
+# Search sessions, cached responses and the request budget are private to
+# a worker by default, with several workers they are shared through SQLite
+# files in ICOOK_SHARED_DIR (a private directory in the temp dir by default)
+# unless set otherwise. The workers inherit the environment of this process
+if workers > 1 and not ("ICOOK_SESSION_URL" in environ and "ICOOK_CACHE_PATH" in environ):
+    shared_dir = private_dir(environ.get("ICOOK_SHARED_DIR") or
+                             path.join(tempfile.gettempdir(), f"icook-{os.getuid()}"))
+    environ.setdefault("ICOOK_SESSION_URL", path.join(shared_dir, "icook-sessions.db"))
+    environ.setdefault("ICOOK_CACHE_PATH", path.join(shared_dir, "icook-cache.db"))
+
+# Callbacks spend most of their time waiting on spoonacular, so every
+# worker serves several requests at once: 'gthread' uses a pool of threads
+# threads per worker, 'gevent' (needs the gevent package) uses greenlets
+worker_class = environ.get("ICOOK_WORKER_CLASS", "gthread")
+threads = int(environ.get("ICOOK_THREADS", 8))
+worker_connections = int(environ.get("ICOOK_WORKER_CONNECTIONS", 100))
+
+# Seconds a request may take before its worker is restarted and seconds
+# given to requests in flight to finish after a SIGTERM
+timeout = int(environ.get("ICOOK_WORKER_TIMEOUT", 30))
+graceful_timeout = int(environ.get("ICOOK_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    """Report the worker as draining on /healthz once it gets a SIGTERM"""
+    import server
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum, frame):
+        server.draining.set()
+        if callable(handle_exit):
+            handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+    signal.siginterrupt(signal.SIGTERM, False)
+
+
+def worker_int(worker):
+    """Report the worker as draining on /healthz on SIGINT or SIGQUIT"""
+    import server
+    server.draining.set()
+
+
+def worker_exit(server, worker):
+    """Stop the background threads of the worker"""
+    import iCook
+    # The Flask server loaded by this worker, unset when it failed to boot
+    application = getattr(worker, 'wsgi', None)
+    if application is not None:
+        iCook.shutdown(application)
@@ -1,41 +1,26 @@
 #!/usr/bin/env python
 
 # System level imports
-from os import environ
+from os import environ, path
 from sys import exit
+from uuid import uuid4
+
+# Ingredient price lookups are fanned out over a bounded thread pool
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # We will log to terminal user interaction and responses
 import logging
 
-# requests library is used for HTTP GET requests
-import requests
-from requests.exceptions import HTTPError
-
-# Pandas will be used for dataframe generation
-# and handling cart data
-import pandas as pd
+# The cart table and its totals are built in plain Python
+from cart import load_cart, make_cart, merge_cart
 
-# Dash framework will be used to handle user interaction
-# and generating the html to be displayed to the user
-import dash
-import dash_table
-from dash.exceptions import PreventUpdate
-import dash_core_components as dcc
-import dash_html_components as html
+# Dash, dash_table and requests (and the modules built on them) take most
+# of the startup time, they are imported by create_app and the callbacks
+# so importing this module stays cheap for tests and tools
 
 # Initialize the logger
 logging.basicConfig(level=logging.INFO)
 
-# Get the API key from the environment variable ICOOK_KEY
-# If it is undefined set it as 'missing_key'
-API_SECRET = environ.get("ICOOK_KEY", 'missing_key')
-
-# If key is missing notify user and exit
-if API_SECRET == 'missing_key':
-    logging.error(
-        f'Please supply a key as an environment variable ICOOK_KEY: {API_SECRET}')
-    exit(1)
-
 # These are the API Docs pertaining to this application
 # -----------------
 # Response for *finding ingredients*
@@ -47,48 +32,322 @@ if API_SECRET == 'missing_key':
 # Response for *price of ingredients*
 # https://spoonacular.com/food-api/docs#Get-Recipe-Price-Breakdown-by-ID
 
-# Use stylesheets for dash components
-external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
-
-# Define the generated html layout
-app.layout = html.Div(
-    [
-        html.Label(
-            [
-                "Enter Ingredients",
-                dcc.Dropdown(id="ingredients-dropdown", multi=True),
-            ]
-        ),
-        html.Button("Search", id="search-recipe", n_clicks_timestamp=1),
-        html.Button("Clear", id="clear-ingredients", n_clicks_timestamp=1),
-
-        # This div shall be hidden until ingredients have been selected
-        html.Div(id='recipe_sub', style={'display': 'none'}, children=[
-            html.Div(id='current-recipe-count', children=0,
-                     style={'display': 'none'}),
-            dcc.Store(id='cached-recipes', data=None),
-            html.Div(id='recipe-title', children=None),
-            html.Img(id='recipe-img'),
-            html.Br(),
-            html.H5("Ingredients you already have:"),
-            html.Div(id='recipe-ingredients', children='ingredients'),
-            dcc.Store(id='missing-ingredients'),
-            html.Button("Save missing ingredients to cart",
-                        id="save-missing", n_clicks_timestamp=1),
-            html.Button("Skip", id="skip-recipe", n_clicks_timestamp=1),
-        ]),
-
-        # This div shall be hidden until save missing ingredients has been selected
-        html.Div(id='shopping-sub', style={'display': 'none'}, children=[
-            html.Div(id='shopping-list', children='shopping list'),
-            html.Br(),
-            html.Br(),
-            html.Button("Empty Cart", id="empty-cart", n_clicks_timestamp=1)
-        ]),
-        dcc.Store(id='cart', storage_type='local')
-    ], style={'width': '600px'}
-)
+# Settings of the app and the environment variable each is read from
+CONFIG_ENV = {
+    # The spoonacular API key
+    'api_key': 'ICOOK_KEY',
+    # Another server such as the mock spoonacular server used by the benchmarks
+    'api_url': 'ICOOK_API_URL',
+    # Seconds to wait on any single spoonacular request before giving up
+    'request_timeout': 'ICOOK_REQUEST_TIMEOUT',
+    # Price lookups in save_to_cart run concurrently on one pool per worker,
+    # this bounds how many are in flight at once for all its cart saves
+    'price_workers': 'ICOOK_PRICE_WORKERS',
+    # 'breakdown' prices the missing ingredients of a recipe with one price
+    # breakdown request, 'ingredient' uses one request per ingredient
+    'pricing': 'ICOOK_PRICING',
+    # Responses are cached in memory, cache_path names an optional SQLite
+    # file shared by every worker on this host
+    'cache_size': 'ICOOK_CACHE_SIZE',
+    'cache_path': 'ICOOK_CACHE_PATH',
+    # A snapshot written by warmup.py loaded into the cache at startup
+    'cache_snapshot': 'ICOOK_CACHE_SNAPSHOT',
+    # A SQLite file keeping every recipe and its instructions, searches are
+    # answered from it first and the API only fills the gaps
+    'catalog_path': 'ICOOK_CATALOG_PATH',
+    # While a recipe is displayed the instructions of the next prefetch_depth
+    # recipes are fetched into the cache so Skip does not wait on the API,
+    # prefetch_prices also warms their price breakdowns
+    'prefetch_depth': 'ICOOK_PREFETCH_DEPTH',
+    'prefetch_prices': 'ICOOK_PREFETCH_PRICES',
+    # A search fetches recipe_page recipes, the next page is fetched in the
+    # background once the user is within prefetch_depth of the last one
+    'recipe_page': 'ICOOK_RECIPE_PAGE',
+    # Spoonacular requests a second (0 turns the limit off) and burst size,
+    # the budget is shared through cache_path when set. quota_reserve daily
+    # points are kept from price lookups (twice as many from prefetches)
+    # for recipe search and display
+    'rate_limit': 'ICOOK_RATE_LIMIT',
+    'rate_burst': 'ICOOK_RATE_BURST',
+    'quota_reserve': 'ICOOK_QUOTA_RESERVE',
+    # Search results are stored under a session token, session_url
+    # selects a shared backend (a redis:// url or a SQLite file path)
+    'session_url': 'ICOOK_SESSION_URL',
+    # The downloadable spoonacular ingredient list for local autocomplete
+    # https://spoonacular.com/food-api/docs#List-of-Ingredients
+    # without it every keystroke is sent to the autocomplete endpoint
+    'ingredients_file': 'ICOOK_INGREDIENTS_FILE',
+    # Seconds an autocomplete query sent to the API waits for the next
+    # keystroke before it is sent, superseded queries are dropped
+    'autocomplete_debounce': 'ICOOK_AUTOCOMPLETE_DEBOUNCE',
+    # Response compression algorithms in order of preference, 'br' needs
+    # the brotli package, empty turns compression off
+    'compress': 'ICOOK_COMPRESS',
+    # Log a json line for every callback request
+    'json_log': 'ICOOK_JSON_LOG',
+}
+
+DEFAULT_CONFIG = {
+    'api_key': None,
+    'api_url': 'https://api.spoonacular.com',
+    'request_timeout': 5.0,
+    'price_workers': 8,
+    'pricing': 'breakdown',
+    'cache_size': 1024,
+    'cache_path': None,
+    'cache_snapshot': None,
+    'catalog_path': None,
+    'prefetch_depth': 3,
+    'prefetch_prices': False,
+    'recipe_page': 5,
+    'rate_limit': 10.0,
+    'rate_burst': 20,
+    'quota_reserve': 10,
+    'session_url': None,
+    'ingredients_file': path.join(path.dirname(path.abspath(__file__)),
+                                  'top-1k-ingredients.csv'),
+    'autocomplete_debounce': 0.15,
+    'compress': 'br,gzip',
+    'json_log': False,
+}
+
+PRICING_MODES = ('breakdown', 'ingredient')
+
+
+class ConfigError(ValueError):
+    """Raised by create_app when the configuration can not be used"""
+
+
+def load_config(env=environ):
+    """load_config
+    --
+    Read the settings given in the environment, values are converted to
+    the type of their default
+    return: a config dictionary
+    """
+    config = dict(DEFAULT_CONFIG)
+    for key, name in CONFIG_ENV.items():
+        if name not in env:
+            continue
+        value = env[name]
+        default = DEFAULT_CONFIG[key]
+        try:
+            if isinstance(default, bool):
+                value = value == '1'
+            elif isinstance(default, (int, float)):
+                value = type(default)(value)
+        except ValueError:
+            raise ConfigError(f'{name} should be a number, not {value!r}')
+        config[key] = value
+    return config
+
+
+def validate_config(config):
+    """Raise a ConfigError describing the first unusable setting"""
+    if not config.get('api_key'):
+        raise ConfigError('Please supply a key as an environment variable ICOOK_KEY')
+    if config['pricing'] not in PRICING_MODES:
+        raise ConfigError(f"pricing should be one of {PRICING_MODES}, not {config['pricing']!r}")
+    for key in ('request_timeout', 'price_workers', 'cache_size', 'rate_burst', 'recipe_page'):
+        if config[key] <= 0:
+            raise ConfigError(f'{key} should be greater than 0, not {config[key]}')
+    for key in ('rate_limit', 'quota_reserve'):
+        if config[key] < 0:
+            raise ConfigError(f'{key} should not be negative, not {config[key]}')
+
+
+def make_client(config, metrics=None):
+    """make_client
+    --
+    Build the spoonacular client config describes, with its response
+    cache, request budget and recipe catalog
+    return: a SpoonacularClient
+    """
+    # All spoonacular requests go through one shared client
+    # and the responses are cached
+    from spoonacular import SpoonacularClient
+    from cache import ResponseCache
+    from catalog import RecipeCatalog
+    # Requests are sent within the spoonacular budget
+    from ratelimit import RateLimiter
+
+    cache = ResponseCache(maxsize=config['cache_size'], path=config['cache_path'])
+    if config['cache_snapshot']:
+        # Start warm from a snapshot written by warmup.py
+        from snapshot import read_snapshot
+        try:
+            count = cache.restore(read_snapshot(config['cache_snapshot']))
+            logging.info(f"Restored {count} cached responses from {config['cache_snapshot']}")
+        except (OSError, ValueError) as err:
+            logging.error(f"Could not restore the cache snapshot: {err}")
+
+    limiter = None
+    if config['rate_limit']:
+        limiter = RateLimiter(rate=config['rate_limit'], burst=config['rate_burst'],
+                              quota_reserve=config['quota_reserve'],
+                              path=config['cache_path'])
+
+    catalog = None
+    if config['catalog_path']:
+        catalog = RecipeCatalog(config['catalog_path'])
+
+    return SpoonacularClient(config['api_key'], base_url=config['api_url'],
+                             timeout=config['request_timeout'], cache=cache,
+                             metrics=metrics, limiter=limiter, catalog=catalog)
+
+
+class Services(object):
+    """Services
+    --
+    The settings and the services shared by the callbacks of one app,
+    built from config by create_app. Every app gets its own, so a second
+    app in the same process leaves the first one untouched
+    """
+
+    def __init__(self, config):
+        # Callback latency, upstream latency and payload sizes are recorded
+        from metrics import (Metrics, cache_collector, catalog_collector, flight_collector,
+                             limiter_collector)
+        # Details of the next recipes are fetched in the background
+        from prefetch import Prefetcher
+        # Search results are kept server side, the browser only holds a token
+        from session_store import make_session_store
+        from paging import RecipePager
+        # Rendered recipes are reused between views
+        from fragments import FragmentCache
+        # Ingredient autocomplete is answered locally where possible
+        from ingredient_index import IngredientIndex
+        from autocomplete import AutocompleteCoalescer
+
+        self.config = config
+
+        # Timings are served on /metrics
+        self.metrics = Metrics()
+
+        # A single pooled client is shared by every callback of the app
+        self.client = make_client(config, self.metrics)
+        self.cache = self.client.cache
+        self.metrics.add_collector(cache_collector(self.cache))
+        self.metrics.add_collector(flight_collector(self.client.flights))
+        if self.client.limiter is not None:
+            self.metrics.add_collector(limiter_collector(self.client.limiter))
+        if self.client.catalog is not None:
+            self.metrics.add_collector(catalog_collector(self.client.catalog))
+        self.prefetcher = Prefetcher(self.client, prices=config['prefetch_prices'])
+        self.sessions = make_session_store(config['session_url'])
+        self.pager = RecipePager(self.client, self.sessions, page_size=config['recipe_page'],
+                                 margin=config['prefetch_depth'])
+        self.fragments = FragmentCache()
+
+        try:
+            self.ingredient_index = IngredientIndex.from_file(config['ingredients_file'])
+        except OSError:
+            logging.info(f"No ingredient list at {config['ingredients_file']}, "
+                         "autocomplete will use the API")
+            self.ingredient_index = IngredientIndex()
+        # Keystrokes that miss the index are debounced and coalesced
+        self.autocompleter = AutocompleteCoalescer(self.client.autocomplete_ingredients,
+                                                   number=8,
+                                                   debounce=config['autocomplete_debounce'])
+        # Ingredient prices of every cart save are looked up on one pool
+        self.price_executor = ThreadPoolExecutor(max_workers=config['price_workers'],
+                                                 thread_name_prefix='price')
+
+    def shutdown(self):
+        """Stop the background prefetch, paging and price threads"""
+        self.prefetcher.shutdown()
+        self.pager.shutdown()
+        self.price_executor.shutdown(wait=False)
+
+
+def create_app(overrides=None):
+    """create_app
+    --
+    Validate the configuration (the environment, updated with overrides),
+    build the services shared by the callbacks and the Dash app
+    return: the Dash app, its Flask server is app.server and the
+    services are app.server.extensions['icook']
+    """
+    config = load_config()
+    config.update(overrides or {})
+    validate_config(config)
+
+    # Dash framework will be used to handle user interaction
+    # and generating the html to be displayed to the user
+    import dash
+
+    from metrics import instrument
+    # Production serving health check and response compression
+    from server import add_compression, add_health_check
+
+    services = Services(config)
+
+    # Use stylesheets for dash components
+    external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
+    # Dash would only ever use gzip, compression is set up here instead
+    app = dash.Dash(__name__, external_stylesheets=external_stylesheets, compress=False)
+    app.server.extensions['icook'] = services
+    instrument(app, services.metrics, json_log=config['json_log'])
+    add_health_check(app.server)
+    add_compression(app.server, config['compress'].split(','))
+    # The layout is built for every page load so each browser gets its own id
+    app.layout = make_layout
+    register_callbacks(app, services)
+    return app
+
+
+def shutdown(server):
+    """Stop the background threads of the app served by the Flask server"""
+    services = server.extensions.get('icook')
+    if services is not None:
+        services.shutdown()
+
+
+def make_layout():
+    """Return the generated html layout"""
+    import dash_core_components as dcc
+    import dash_html_components as html
+
+    # Define the generated html layout
+    return html.Div(
+        [
+            html.Label(
+                [
+                    "Enter Ingredients",
+                    dcc.Dropdown(id="ingredients-dropdown", multi=True),
+                ]
+            ),
+            html.Button("Search", id="search-recipe", n_clicks_timestamp=1),
+            html.Button("Clear", id="clear-ingredients", n_clicks_timestamp=1),
+
+            # This div shall be hidden until ingredients have been selected
+            html.Div(id='recipe_sub', style={'display': 'none'}, children=[
+                html.Div(id='current-recipe-count', children=0,
+                         style={'display': 'none'}),
+                dcc.Store(id='cached-recipes', data=None),
+                html.Div(id='recipe-title', children=None),
+                html.Img(id='recipe-img'),
+                html.Br(),
+                html.H5("Ingredients you already have:"),
+                html.Div(id='recipe-ingredients', children='ingredients'),
+                dcc.Store(id='missing-ingredients'),
+                html.Button("Save missing ingredients to cart",
+                            id="save-missing", n_clicks_timestamp=1),
+                html.Button("Skip", id="skip-recipe", n_clicks_timestamp=1),
+            ]),
+
+            # This div shall be hidden until save missing ingredients has been selected
+            html.Div(id='shopping-sub', style={'display': 'none'}, children=[
+                html.Div(id='shopping-list', children='shopping list'),
+                html.Br(),
+                html.Br(),
+                html.Button("Empty Cart", id="empty-cart", n_clicks_timestamp=1)
+            ]),
+            dcc.Store(id='cart', storage_type='local'),
+            # Identifies this browser to drop its superseded autocomplete queries
+            dcc.Store(id='client-id', data=uuid4().hex)
+        ], style={'width': '600px'}
+    )
 
 
 """
@@ -101,40 +360,37 @@ OUTPUT (Return values)
     populate_ingredient_options will return a list of available options including
         current ingredients already selected
 """
-@app.callback(
-    dash.dependencies.Output("ingredients-dropdown", "options"),
-    [dash.dependencies.Input("ingredients-dropdown", "search_value")],
-    [dash.dependencies.State("ingredients-dropdown", "value")],
-)
-def populate_ingredient_options(search_value, value):
+def populate_ingredient_options(services, search_value, value, client_id=None):
     """populate_ingredient_options
     --
-    This callback will query the spoonacular server once user
-    has entered characters
-    Alternatively we could auto fill the options with
-    ingredients from this long list that will become outdated
+    This callback will search the local ingredient index once user
+    has entered characters, the index is built from this long list
     https://spoonacular.com/food-api/docs#List-of-Ingredients
+    the spoonacular server is only queried when nothing local matches,
+    a query replaced by a newer keystroke of the same browser is dropped
     """
+    from dash.exceptions import PreventUpdate
+    from requests.exceptions import RequestException
+    from autocomplete import Superseded
+
     # Stop dash from firing this callback until we are ready
     if not search_value:
         raise PreventUpdate
     logging.debug(f'Doing a ingredient query on \'{search_value}\'')
     logging.debug(f'Current value is \'{value}\'')
 
-    # Here we will update ingredients with a real query result
-    try:
-        response = requests.get('https://api.spoonacular.com/food/ingredients/autocomplete?query=' +
-                                search_value + '&number=8' +
-                                "&apiKey=" + API_SECRET)
-        # check that requests didn't receive api related errors:
-        # 401 status code
-        if response.status_code == 401:
-            logging.error("API Key related error")
-        response.raise_for_status()
-        ingredients = response.json()
-        logging.debug(f"Response is:  {ingredients}")
-    except HTTPError as http_err:
-        logging.error(f'HTTP error occurred: {http_err}')
+    # Here we will update ingredients with a local match
+    # or a real query result when there is none
+    ingredients = services.ingredient_index.search(search_value, number=8)
+    if not ingredients:
+        try:
+            ingredients = services.autocompleter.search(search_value, client_id)
+            logging.debug(f"Response is:  {ingredients}")
+        except Superseded:
+            # A newer query is on its way, never let this answer overwrite it
+            raise PreventUpdate
+        except RequestException as http_err:
+            logging.error(f'HTTP error occurred: {http_err}')
 
     options = [{'label': i['name'].title(), 'value':i['name']}
                for i in ingredients]
@@ -162,42 +418,29 @@ INPUT:
     This callback will read values of:
         selected ingredients dropdown
         recipe index counter
-        data store of cached recipies
+        session token of the cached recipies
 
 OUTPUT (return values):
     The callback will modify:
         anything on the page relating to recipies and recipe caching
 """
-@app.callback(
-    [dash.dependencies.Output("recipe_sub", "style"),
-     dash.dependencies.Output("recipe-title", "children"),
-     dash.dependencies.Output("recipe-img", 'src'),
-     dash.dependencies.Output("recipe-ingredients", "children"),
-     dash.dependencies.Output("missing-ingredients", "data"),
-     dash.dependencies.Output("save-missing", "children"),
-     dash.dependencies.Output("cached-recipes", "data"),
-     dash.dependencies.Output("current-recipe-count", "children"),
-     dash.dependencies.Output("ingredients-dropdown", "value")],
-    [dash.dependencies.Input("search-recipe", "n_clicks_timestamp"),
-     dash.dependencies.Input("skip-recipe", "n_clicks_timestamp"),
-     dash.dependencies.Input("clear-ingredients", "n_clicks_timestamp")],
-    [dash.dependencies.State("ingredients-dropdown", "value"),
-     dash.dependencies.State("current-recipe-count", "children"),
-     dash.dependencies.State("cached-recipes", "data")],
-)
-def generate_recipies(search_btn, skip_btn, clear_btn, ingredients_selected,
-                      cur_recipe_idx, cached_recipes):
+def generate_recipies(services, search_btn, skip_btn, clear_btn, ingredients_selected,
+                      cur_recipe_idx, session_token):
     """generate_recipies
     --
     Here the recipe is parsed, displayed on the screen
-        other recipies are stored as a browser data element
+        other recipies are stored server side, the browser data element
+        only holds the session token they are stored under, more recipies
+        are fetched as the user skips towards the last one
     """
+    from dash.exceptions import PreventUpdate
+    from requests.exceptions import RequestException
+    from fragments import render_recipe
+
     # Stop dash from firing this callback until we are ready
     if not ingredients_selected:
         raise PreventUpdate
 
-    recipe_buffer = 30
-
     # Check that search button was clicked not skip or clear
     if search_btn > clear_btn and search_btn > skip_btn:
         logging.info(f"search clicked, ingredients selected are: {','.join(ingredients_selected)}")
@@ -205,19 +448,8 @@ def generate_recipies(search_btn, skip_btn, clear_btn, ingredients_selected,
         # Here we should fire the search recipe with ingredients_selected query
         # to update the recipies variable
         # https://api.spoonacular.com/recipes/findByIngredients?ingredients=apples,+flour,+sugar&number=2
-        try:
-            response = requests.get('https://api.spoonacular.com/recipes/findByIngredients?ingredients=' + ','.join(
-                ingredients_selected) + '&number=' + str(recipe_buffer) + "&apiKey=" + API_SECRET)
-            # check that requests didn't receive api related errors:
-            # 401 status code
-            if response.status_code == 401:
-                logging.error("API Key related error")
-            response.raise_for_status()
-            # store json response as recipe data
-            recipies = response.json()
-            logging.debug(f"Response is:  {recipies}")
-        except HTTPError as http_err:
-            logging.error(f'HTTP error occurred: {http_err}')
+        session_token, session = search_recipies(services, ingredients_selected)
+        cur_recipe_idx = 0
 
     # When clearing we will hide the recipe div and blank recipe elements
     # rename the save ingredients button to clear the number value
@@ -230,69 +462,87 @@ def generate_recipies(search_btn, skip_btn, clear_btn, ingredients_selected,
         logging.info("skip clicked")
 
         # Use the cached list and iterate to the next element
-        recipies = cached_recipes
+        session = services.pager.get(session_token)
+        if session is None:
+            # The session expired or is held by another worker, search again
+            logging.info("Recipe session not found, repeating the search")
+            session_token, session = search_recipies(services, ingredients_selected)
 
         # TODO: Return a "Last recipe message"
-        # this is a quick fix that will wrap the user back
-        # to the first recipe to prevent a index error on recipies
-        if cur_recipe_idx < recipe_buffer-1:
-            cur_recipe_idx = cur_recipe_idx + 1
-        else:
-            cur_recipe_idx = 0
+        # after the last recipe spoonacular has the user
+        # is wrapped back to the first one
+        session, cur_recipe_idx = services.pager.next(session_token, session, cur_recipe_idx)
 
-    # recipe title
-    recipe_title = html.H4(recipies[cur_recipe_idx]['title'])
+    # the recipies are compact recipes.Recipe records
+    recipies = session['recipes']
+    recipe = recipies[cur_recipe_idx]
 
     # recipe image
-    cur_recipe_image = recipies[cur_recipe_idx]['image']
-
-    # recipe ingredients we have
-    used_ingredients_images = [html.Img(src=n['image'])
-                               for n in
-                               recipies[cur_recipe_idx]['usedIngredients']]
+    cur_recipe_image = recipe.image
 
     # TODO: Make 'recipe steps' a first-class class
     # Quick fix: Append to our ingredients photo a header and list of steps
-    current_id = recipies[cur_recipe_idx]['id']
+    current_id = recipe.id
 
     logging.info(f"Current recipe id: {current_id}")
 
-    try:
-        response = requests.get('https://api.spoonacular.com/recipes/' + str(
-            current_id) + '/analyzedInstructions' +
-            "?stepBreakdown=true&apiKey=" + API_SECRET)
-        # check that requests didn't receive api related errors:
-        # 401 status code
-        if response.status_code == 401:
-            logging.error("API Key related error")
-        response.raise_for_status()
-        # access JSOn content
-        recipe_steps = response.json()
-    except HTTPError as http_err:
-        print(f'HTTP error occurred: {http_err}')
-
-    if len(recipe_steps) > 0:
-        recipe_steps = [html.H5("Steps:"), html.Ol([html.Li(
-            children=recipe_steps[0]['steps'][n]['step']) for n in range(len(recipe_steps[0]['steps']))])]
-        used_ingredients_images = used_ingredients_images + recipe_steps
+    # Warm the cache for the recipes the user will skip to next
+    depth = services.config['prefetch_depth']
+    services.prefetcher.prefetch([r.id for r in
+                                  recipies[cur_recipe_idx + 1:cur_recipe_idx + 1 + depth]])
+
+    # The recipe title, ingredients we have and steps are rendered once
+    # as plain dicts and reused on later views of the recipe
+    fragment = services.fragments.get(recipe)
+    if fragment is None:
+        try:
+            # access JSOn content
+            recipe_steps = services.client.analyzed_instructions(current_id)
+            fragment = render_recipe(recipe, recipe_steps)
+            services.fragments.set(recipe, fragment)
+        except RequestException as http_err:
+            logging.error(f'HTTP error occurred: {http_err}')
+            # Not kept, the steps are added once they can be fetched
+            fragment = render_recipe(recipe, [])
 
     # recipe missing ingredients
-    recipe_missing_ingredients = [{'name': n['name'], 'id':n['id'], 'aisle':n['aisle'], 'amount':n['amount'],
-                                  'unit':n['unit']} for n in
-                                  recipies[cur_recipe_idx]['missedIngredients']]
+    # the recipe id lets the cart price them from the recipe price breakdown
+    recipe_missing_ingredients = [n.to_dict(current_id) for n in recipe.missed]
     logging.debug(f"Writing missing ingredients as {recipe_missing_ingredients}")
 
     # update button title
-    save_recipe_btn = "Save " + \
-        str(recipies[cur_recipe_idx]['missedIngredientCount']
-            ) + " Missing ingredients to cart"
+    save_recipe_btn = "Save " + str(recipe.missed_count) + " Missing ingredients to cart"
     return [{'display': 'block', 'border-radius': '25px',
              'border': '15px solid #73AD21', 'padding': '20px', },
-            recipe_title, cur_recipe_image, used_ingredients_images,
-            recipe_missing_ingredients, save_recipe_btn, recipies,
+            fragment['title'], cur_recipe_image, fragment['ingredients'],
+            recipe_missing_ingredients, save_recipe_btn, session_token,
             cur_recipe_idx, ingredients_selected]
 
 
+def search_recipies(services, ingredients_selected):
+    """search_recipies
+    --
+    Find the first page of recipies using the selected ingredients
+    https://spoonacular.com/food-api/docs#Search-Recipes-by-Ingredients
+    return: the session token and search session, the callback is not
+    updated when the search fails or finds nothing
+    """
+    from dash.exceptions import PreventUpdate
+    from requests.exceptions import RequestException
+
+    try:
+        # store json response as recipe data
+        session_token, session = services.pager.start(ingredients_selected)
+        logging.debug(f"Response is:  {session['recipes']}")
+    except RequestException as http_err:
+        logging.error(f'HTTP error occurred: {http_err}')
+        raise PreventUpdate
+    if not session['recipes']:
+        logging.info("No recipes found")
+        raise PreventUpdate
+    return session_token, session
+
+
 """
 save_to_cart
 This callback handles displaying and clearing of cart data
@@ -313,16 +563,11 @@ OUTPUT (Return values)
     -shopping cart long term storage
 
 """
-@app.callback(
-    [dash.dependencies.Output("shopping-sub", "style"),
-     dash.dependencies.Output("shopping-list", "children"),
-     dash.dependencies.Output("cart", "data")],
-    [dash.dependencies.Input("save-missing", "n_clicks_timestamp"),
-     dash.dependencies.Input("empty-cart", "n_clicks_timestamp")],
-    [dash.dependencies.State("cart", "data"),
-     dash.dependencies.State("missing-ingredients", "data")],
-)
-def save_to_cart(save_cart, empty_cart, current_cart, missing_ing):
+def save_to_cart(services, save_cart, empty_cart, current_cart, missing_ing):
+    import dash_table
+
+    config = services.config
+    metrics = services.metrics
 
     # Our cart does exist lets print it now
     if current_cart is not None and len(current_cart) > 0:
@@ -336,56 +581,42 @@ def save_to_cart(save_cart, empty_cart, current_cart, missing_ing):
         logging.info("Empty cart was clicked")
         return [{'display': 'none'}, '', None]
 
+    # The cart is stored as a mapping of ingredient id to a single line
+    cart_lines = load_cart(current_cart)
+
     # Save cart was clicked more recently
     # Check with button timestamps for which was clicked most recent
-    # Calculate missing ingredient price, generate a cart dataframe
-    # Display the dataframe as a table
-    if int(empty_cart) < int(save_cart):
+    # Merge the missing ingredients into the cart, price the changed lines
+    # Display the cart as a table
+    if int(empty_cart) < int(save_cart) and missing_ing:
         logging.info(
             f"Save to cart clicked, missing ingredients are {','.join([n['name'] for n in missing_ing])}")
 
-        # We will need to iterate over each ingredeint to get price
+        # The recipe price breakdown prices most ingredients in one request
+        if config['pricing'] == 'breakdown':
+            with metrics.time('icook_section_seconds', section='price_breakdown'):
+                price_from_breakdown(services.client, missing_ing)
+
+        # Ingredients already in the cart are merged into their line and
+        # only new lines the breakdown did not price need a lookup, these are
+        # independent so they are fetched concurrently
         # we already have aisle data
-        # https://spoonacular.com/food-api/docs#Get-Ingredient-Information
-        for ingredient in missing_ing:
-            try:
-                response = requests.get('https://api.spoonacular.com/food/ingredients/' + str(
-                    ingredient['id']) + '/information?amount=' + str(ingredient['amount']) + "&apiKey=" + API_SECRET)
-                # check that requests didn't receive api related errors:
-                # 401 status code
-                if response.status_code == 401:
-                    logging.error("API Key related error")
-                response.raise_for_status()
-                # access JSOn content
-                ing_cost = response.json()
-                logging.debug(f"Response is:  {ing_cost}")
-                ingredient.update({'cost': ing_cost['estimatedCost']['value']})
-            except HTTPError as http_err:
-                logging.error(
-                    f'HTTP error occurred getting prices: {http_err}')
-                ingredient.update({'cost': 0.00})
+        to_price = merge_cart(cart_lines, missing_ing)
+        with metrics.time('icook_section_seconds', section='price_ingredients'):
+            price_ingredients(services.client, [cart_lines[key] for key in to_price],
+                              services.price_executor, config['request_timeout'] * 2)
 
         logging.debug(
-            f"Prices have been appended now display dataframe {missing_ing}")
-
-    # Lets check if this is a secondary+ run then append current cart
-    if current_cart:
-        # We have a cart saved but no recent queries
-        if missing_ing is None or len(missing_ing) == 0:
-            missing_ing = current_cart
-        else:
-            missing_ing.extend(current_cart)
-            logging.debug(
-                f"We've appended a old cart, new cart looks like {missing_ing}")
+            f"Prices have been appended now display cart {cart_lines}")
+
     # We have a empty cart and no current missing ingredients
-    if missing_ing is None or len(missing_ing) == 0:
+    if not cart_lines:
         logging.debug("No prior cart, lets just return")
         return [{'display': 'none'}, '', '']
 
-    logging.debug(f"Missing ingredeints are {missing_ing}")
-
-    # Convert ingredients dictionary into a cart dataframe
-    cart = make_cart(missing_ing)
+    # Convert the cart lines into a cart with a total row
+    with metrics.time('icook_section_seconds', section='make_cart'):
+        cart = make_cart(cart_lines.values())
 
     # Build the table
     missing_prices = dash_table.DataTable(
@@ -395,33 +626,151 @@ def save_to_cart(save_cart, empty_cart, current_cart, missing_ing):
         sort_action="native"
     )
 
-    return [{'display': 'block'}, missing_prices, missing_ing]
+    return [{'display': 'block'}, missing_prices, cart_lines]
 
 
-def make_cart(ingredient_dict):
-    """Make a missing ingredient dictionary
-    accepts a ingredient dictionary containing name and aisle
-    return: a dataframe cart to be passed into a datatable later
+def price_from_breakdown(client, ingredients):
+    """price_from_breakdown
+    --
+    Set the 'cost' of ingredients from the price breakdown of the recipe
+    they were saved from, one request per recipe instead of per ingredient
+    https://spoonacular.com/food-api/docs#Get-Recipe-Price-Breakdown-by-ID
+    The breakdown has no ingredient ids so lines are matched by name,
+    ingredients without a match are left without a cost
     """
+    from requests.exceptions import RequestException
 
-    df = pd.DataFrame.from_dict(ingredient_dict)
-    # Remove index
-    df.reset_index(drop=True, inplace=True)
-
-    # Make a neat total row
-    df.loc['Total', :] = df.sum()
+    recipe_ids = {i['recipe_id'] for i in ingredients if i.get('recipe_id')}
+    for recipe_id in recipe_ids:
+        try:
+            breakdown = client.price_breakdown(recipe_id)
+        except RequestException as http_err:
+            logging.error(f'HTTP error occurred getting price breakdown: {http_err}')
+            continue
+        prices = {}
+        for line in breakdown.get('ingredients', []):
+            name = line['name'].strip().lower()
+            prices[name] = prices.get(name, 0.0) + line['price']
+        for ingredient in ingredients:
+            if ingredient.get('recipe_id') != recipe_id:
+                continue
+            name = ingredient['name'].strip().lower()
+            # Allow for 'egg' in one list and 'eggs' in the other
+            for candidate in (name, name + 's', name.rstrip('s')):
+                if candidate in prices:
+                    ingredient['cost'] = prices[candidate]
+                    break
+    return ingredients
+
+
+def fetch_ingredient_price(client, ingredient):
+    """fetch_ingredient_price
+    --
+    Query the estimated cost of a single ingredient for the amount required
+    https://spoonacular.com/food-api/docs#Get-Ingredient-Information
+    return: the estimated cost value
+    """
+    ing_cost = client.ingredient_information(ingredient['id'], amount=ingredient['amount'],
+                                             unit=ingredient.get('unit'))
+    logging.debug(f"Response is:  {ing_cost}")
+    return ing_cost['estimatedCost']['value']
 
-    # Cleanup the total row
-    df.iloc[-1, df.columns.get_loc('name')] = 'Total'
-    df.iloc[-1, df.columns.get_loc('aisle')] = ''
 
-    # Remove unused columns
-    df = df.drop(['unit', 'id', 'amount'], axis=1)
-    return df
+def price_ingredients(client, ingredients, executor, timeout=10.0):
+    """price_ingredients
+    --
+    Update every ingredient with a 'cost' key, the lookups are run on
+    executor, the bounded pool shared by every cart save, so a cart save
+    takes about as long as the slowest lookup rather than the sum of all
+    of them.
+    Any lookup that errors or does not finish within timeout seconds
+    is priced at 0.00 so the rest of the cart is still displayed
+    """
+    from requests.exceptions import RequestException
+
+    if not ingredients:
+        return ingredients
+
+    futures = {executor.submit(fetch_ingredient_price, client, ingredient): ingredient
+               for ingredient in ingredients}
+    # Do not block on stragglers, their results are discarded
+    done, not_done = wait(futures, timeout=timeout)
+
+    for future, ingredient in futures.items():
+        if future in not_done:
+            future.cancel()
+            logging.error(f"Timed out getting price of {ingredient['name']}")
+            ingredient.update({'cost': 0.00})
+            continue
+        try:
+            ingredient.update({'cost': future.result()})
+        except (RequestException, KeyError, ValueError) as err:
+            logging.error(f'HTTP error occurred getting prices: {err}')
+            ingredient.update({'cost': 0.00})
+    return ingredients
+
+
+def register_callbacks(app, services):
+    """Register the callbacks on app, each is called with services
+    and timed"""
+    from functools import wraps
+    from dash.dependencies import Input, Output, State
+
+    def timed(callback):
+        @wraps(callback)
+        def bound(*args):
+            return callback(services, *args)
+        return services.metrics.timed('icook_callback_seconds',
+                                      callback=callback.__name__)(bound)
+
+    app.callback(
+        Output("ingredients-dropdown", "options"),
+        [Input("ingredients-dropdown", "search_value")],
+        [State("ingredients-dropdown", "value"),
+         State("client-id", "data")],
+    )(timed(populate_ingredient_options))
+
+    app.callback(
+        [Output("recipe_sub", "style"),
+         Output("recipe-title", "children"),
+         Output("recipe-img", 'src'),
+         Output("recipe-ingredients", "children"),
+         Output("missing-ingredients", "data"),
+         Output("save-missing", "children"),
+         Output("cached-recipes", "data"),
+         Output("current-recipe-count", "children"),
+         Output("ingredients-dropdown", "value")],
+        [Input("search-recipe", "n_clicks_timestamp"),
+         Input("skip-recipe", "n_clicks_timestamp"),
+         Input("clear-ingredients", "n_clicks_timestamp")],
+        [State("ingredients-dropdown", "value"),
+         State("current-recipe-count", "children"),
+         State("cached-recipes", "data")],
+    )(timed(generate_recipies))
+
+    app.callback(
+        [Output("shopping-sub", "style"),
+         Output("shopping-list", "children"),
+         Output("cart", "data")],
+        [Input("save-missing", "n_clicks_timestamp"),
+         Input("empty-cart", "n_clicks_timestamp")],
+        [State("cart", "data"),
+         State("missing-ingredients", "data")],
+    )(timed(save_to_cart))
 
 
 # When running this script from shell
 # the server should be started as follows:
-# Debugging set off, access may be limited by host ip, port is defined
+# Requests are served on a pool of ICOOK_THREADS threads, access may be
+# limited by host ip, port is defined
+# For several worker processes use gunicorn, see gunicorn.conf.py
 if __name__ == "__main__":
-    app.run_server(debug=False, host='0.0.0.0', port=8050)
+    from server import serve
+    try:
+        app = create_app()
+    except ConfigError as err:
+        logging.error(err)
+        exit(1)
+    serve(app.server, host='0.0.0.0', port=int(environ.get("ICOOK_PORT", 8050)),
+          threads=int(environ.get("ICOOK_THREADS", 8)),
+          on_shutdown=app.server.extensions['icook'].shutdown)
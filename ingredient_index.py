@@ -0,0 +1,68 @@
+"""
+Local ingredient autocomplete
+
+Spoonacular publishes its list of ingredients for download
+https://spoonacular.com/food-api/docs#List-of-Ingredients
+the list is loaded once at startup into sorted arrays so every keystroke
+is answered with a binary search instead of an HTTP request.
+"""
+
+# We will log to terminal how many ingredients were loaded
+import logging
+from bisect import bisect_left
+
+
+class IngredientIndex(object):
+    """IngredientIndex
+    --
+    A prefix index over ingredient names. A query matches names starting
+    with it and names with a later word starting with it, so 'egg' finds
+    both 'egg yolk' and 'hard boiled egg'
+    """
+
+    def __init__(self, names=()):
+        names = {n.strip().lower() for n in names if n.strip()}
+        # Sorted names for matches at the start of the name
+        self.names = sorted(names)
+        # Sorted (word, name) pairs for matches on any later word
+        self.words = sorted((word, name) for name in names
+                            for word in name.split()[1:])
+
+    @classmethod
+    def from_file(cls, path):
+        """Load the spoonacular ingredient list, one 'name;id' per line"""
+        with open(path, encoding='utf-8') as ingredient_file:
+            names = [line.split(';')[0] for line in ingredient_file]
+        index = cls(names)
+        logging.info(f"Loaded {len(index)} ingredients from {path}")
+        return index
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query, number=8):
+        """search
+        --
+        return: up to number matches shaped like the spoonacular
+        autocomplete response, names starting with the query first and
+        shorter (more general) names before longer ones
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        prefix = []
+        i = bisect_left(self.names, query)
+        while i < len(self.names) and self.names[i].startswith(query):
+            prefix.append(self.names[i])
+            i += 1
+
+        word = []
+        i = bisect_left(self.words, (query,))
+        while i < len(self.words) and self.words[i][0].startswith(query):
+            word.append(self.words[i][1])
+            i += 1
+
+        matches = (sorted(prefix, key=len) +
+                   sorted(set(word) - set(prefix), key=lambda n: (len(n), n)))
+        return [{'name': name} for name in matches[:number]]
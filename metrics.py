@@ -0,0 +1,217 @@
+"""
+Latency and payload instrumentation
+
+Timings are kept as Prometheus style histograms and rendered as text on
+the /metrics endpoint of the Dash Flask server. Three levels are recorded
+so a slow click can be attributed:
+    icook_request_seconds   the whole Dash HTTP request, serialization included
+    icook_callback_seconds  the body of each callback
+    icook_upstream_seconds  each spoonacular request, by endpoint
+plus the request and response payload sizes of every callback.
+"""
+
+# We will log one json line per request when asked to
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Upper bounds in bytes of the payload histogram buckets
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+HELP = {
+    'icook_request_seconds': 'Dash callback HTTP request latency',
+    'icook_callback_seconds': 'Time spent in the callback function',
+    'icook_upstream_seconds': 'Spoonacular request latency',
+    'icook_section_seconds': 'Time spent in a section of a callback',
+    'icook_request_bytes': 'Dash callback request payload size',
+    'icook_response_bytes': 'Dash callback response payload size',
+}
+
+
+def _format_labels(labels):
+    return ','.join(f'{k}="{v}"' for k, v in labels)
+
+
+def _sample(name, labels, value):
+    """One exposition line, the braces are left out without labels"""
+    if labels:
+        return f'{name}{{{_format_labels(labels)}}} {value}'
+    return f'{name} {value}'
+
+
+class Histogram(object):
+    """Cumulative bucket counts, a sum and a count of observations"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics(object):
+    """Metrics
+    --
+    A registry of histograms keyed by metric name and labels, extra
+    samples (such as the cache counters) are added by collector functions
+    returning (name, labels dict, value) tuples
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Observe the seconds spent in the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator observing the seconds spent in each call"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            seen = set()
+            for (name, labels), histogram in histograms:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f'# HELP {name} {HELP.get(name, name)}')
+                    lines.append(f'# TYPE {name} histogram')
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(_sample(name + '_bucket', labels + (('le', bound),), count))
+                lines.append(_sample(name + '_bucket', labels + (('le', '+Inf'),),
+                                     histogram.count))
+                lines.append(_sample(name + '_sum', labels, histogram.sum))
+                lines.append(_sample(name + '_count', labels, histogram.count))
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                lines.append(_sample(name, tuple(sorted(labels.items())), value))
+        return '\n'.join(lines) + '\n'
+
+
+def cache_collector(cache):
+    """Expose the hit and miss counters of a cache.ResponseCache"""
+    def collect():
+        samples = []
+        for endpoint, stats in cache.stats().items():
+            samples.append(('icook_cache_hits_total', {'endpoint': endpoint}, stats['hits']))
+            samples.append(('icook_cache_misses_total', {'endpoint': endpoint}, stats['misses']))
+            samples.append(('icook_cache_hit_ratio', {'endpoint': endpoint}, stats['hit_rate']))
+            samples.append(('icook_cache_stale_total', {'endpoint': endpoint}, stats['stale']))
+        samples.append(('icook_cache_entries', {}, len(cache)))
+        return samples
+    return collect
+
+
+def flight_collector(flights):
+    """Expose the number of calls a singleflight.SingleFlight shared"""
+    def collect():
+        return [('icook_upstream_shared_total', {}, flights.shared)]
+    return collect
+
+
+def catalog_collector(catalog):
+    """Expose the size of a catalog.RecipeCatalog and the lookups it answered"""
+    def collect():
+        samples = [('icook_catalog_hits_total', {'kind': kind}, count)
+                   for kind, count in sorted(dict(catalog.hits).items())]
+        samples.append(('icook_catalog_recipes', {}, len(catalog)))
+        return samples
+    return collect
+
+
+def limiter_collector(limiter):
+    """Expose the refused requests and quota left of a ratelimit.RateLimiter"""
+    def collect():
+        samples = [('icook_budget_refused_total', {'priority': name}, count)
+                   for name, count in sorted(dict(limiter.refused).items())]
+        left = limiter.quota_left()
+        if left is not None:
+            samples.append(('icook_quota_left', {}, left))
+        return samples
+    return collect
+
+
+def instrument(app, metrics, json_log=False):
+    """instrument
+    --
+    Time every Dash callback request on the Flask server of app, record
+    its payload sizes and serve the metrics on /metrics.
+    With json_log a structured line is logged for every callback request
+    """
+    from flask import Response, g, request
+
+    server = app.server
+
+    def callback_name():
+        """Name of the callback function targeted by this request"""
+        try:
+            output = request.get_json(silent=True)['output']
+            return app.callback_map[output]['callback'].__name__
+        except (KeyError, TypeError):
+            return 'unknown'
+
+    @server.before_request
+    def start_timer():
+        g.icook_start = time.perf_counter()
+
+    @server.after_request
+    def record_request(response):
+        if not request.path.endswith('/_dash-update-component'):
+            return response
+        elapsed = time.perf_counter() - g.icook_start
+        name = callback_name()
+        request_bytes = request.content_length or 0
+        response_bytes = response.calculate_content_length() or 0
+        metrics.observe('icook_request_seconds', elapsed, callback=name)
+        metrics.observe('icook_request_bytes', request_bytes, SIZE_BUCKETS, callback=name)
+        metrics.observe('icook_response_bytes', response_bytes, SIZE_BUCKETS, callback=name)
+        if json_log:
+            logging.info(json.dumps({'callback': name,
+                                     'status': response.status_code,
+                                     'duration_ms': round(elapsed * 1000, 2),
+                                     'request_bytes': request_bytes,
+                                     'response_bytes': response_bytes}))
+        return response
+
+    @server.route('/metrics')
+    def render_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,129 @@
+"""
+Recipe search results fetched a page at a time
+
+Most users look at two or three recipes, so a search only fetches a
+small first page. As the user skips towards the end of what has been
+fetched the next page is requested in the background, and when they
+reach the end before it arrived it is fetched while they wait. The
+search endpoint has no offset, a page is fetched by asking for more
+recipes and keeping those not already in the session, so no recipe is
+shown twice. The search session, stored under its token, is
+    {'ingredients': [...], 'recipes': [recipes.Recipe...], 'exhausted': bool}
+where exhausted means spoonacular has no more recipes to give.
+"""
+
+# We will log to terminal paging failures
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import RequestException
+
+# Background pages only use what is left of the request budget
+from ratelimit import INTERACTIVE, PREFETCH
+from singleflight import SingleFlight
+# A page refused in the background is fetched again for a waiting user
+from spoonacular import shared_call
+
+# The most recipes spoonacular returns for one search
+MAX_RECIPES = 100
+
+
+class RecipePager(object):
+    """RecipePager
+    --
+    Keeps the recipe search sessions of a SessionStore filled using a
+    SpoonacularClient, page_size recipes are added at a time and a page
+    is requested once at most margin unseen recipes are left
+    """
+
+    def __init__(self, client, sessions, page_size=5, margin=3, workers=2):
+        self.client = client
+        self.sessions = sessions
+        self.page_size = page_size
+        self.margin = margin
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='paging')
+        # A page requested in the background and while waiting is fetched once
+        self.flights = SingleFlight()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def start(self, ingredients):
+        """start
+        --
+        Search the first page of recipes for ingredients
+        return: the token of the new session and the session
+        raises: RequestException when the search fails
+        """
+        recipes = self.client.find_by_ingredients(ingredients, number=self.page_size)
+        session = {'ingredients': list(ingredients), 'recipes': list(recipes),
+                   'exhausted': len(recipes) < self.page_size}
+        token = self.sessions.create(session)
+        self._ensure(token, session, 0)
+        return token, session
+
+    def get(self, token):
+        """Return the session of token, None when it is unknown or expired"""
+        return self.sessions.get(token)
+
+    def _grow(self, token, priority, known):
+        """Fetch the next page of the session of token and store it,
+        unless it already holds more than the known number of recipes"""
+        session = self.sessions.get(token)
+        if session is None or session['exhausted'] or len(session['recipes']) > known:
+            return session
+        recipes = session['recipes']
+        number = min(len(recipes) + self.page_size, MAX_RECIPES)
+        found = self.client.find_by_ingredients(session['ingredients'], number=number,
+                                                priority=priority)
+        seen = {r.id for r in recipes}
+        new = [r for r in found if r.id not in seen]
+        # A new dict so readers never see a half updated session
+        session = {'ingredients': session['ingredients'], 'recipes': recipes + new,
+                   'exhausted': not new or len(found) < number or number == MAX_RECIPES}
+        logging.info(f"Added {len(new)} recipes to session {token}")
+        self.sessions.put(token, session)
+        return session
+
+    def _grow_later(self, token, known):
+        try:
+            shared_call(self.flights, token, PREFETCH, self._grow, token, PREFETCH, known)
+        except RequestException as http_err:
+            logging.debug(f'Fetching more recipes failed: {http_err}')
+        finally:
+            with self._lock:
+                self._pending.discard(token)
+
+    def _ensure(self, token, session, index):
+        """Request the next page in the background when index nears the end"""
+        if session['exhausted'] or len(session['recipes']) - 1 - index > self.margin:
+            return
+        with self._lock:
+            if token in self._pending:
+                return
+            self._pending.add(token)
+        self._executor.submit(self._grow_later, token, len(session['recipes']))
+
+    def next(self, token, session, index):
+        """next
+        --
+        Move from the recipe at index to the next one, fetching the next
+        page while waiting when it is not there yet. After the last recipe
+        spoonacular has the user is taken back to the first
+        return: the session and the new index
+        """
+        index += 1
+        if index >= len(session['recipes']) and not session['exhausted']:
+            try:
+                session = shared_call(self.flights, token, INTERACTIVE, self._grow, token,
+                                      INTERACTIVE, len(session['recipes'])) or session
+            except RequestException as http_err:
+                logging.error(f'HTTP error occurred: {http_err}')
+        if index >= len(session['recipes']):
+            index = 0
+        self._ensure(token, session, index)
+        return session, index
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
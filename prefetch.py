@@ -0,0 +1,58 @@
+"""
+Background prefetching of recipe details
+
+Once a search has returned, the ids of the buffered recipes are known.
+The instructions (and optionally price breakdowns) of the next few recipes
+are requested on a small thread pool while the user reads the current one,
+the client's response cache then answers Skip without a round trip.
+"""
+
+# We will log to terminal prefetch failures
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import RequestException
+
+# Prefetches only use what is left of the request budget
+from ratelimit import PREFETCH
+
+
+class Prefetcher(object):
+    """Prefetcher
+    --
+    Warms the cache of a SpoonacularClient for a list of recipe ids,
+    a recipe already being fetched is not submitted again
+    """
+
+    def __init__(self, client, workers=2, prices=False):
+        self.client = client
+        self.prices = prices
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='prefetch')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _warm(self, recipe_id):
+        """Fetch the details of one recipe so they land in the cache"""
+        try:
+            self.client.analyzed_instructions(recipe_id, priority=PREFETCH)
+            if self.prices:
+                self.client.price_breakdown(recipe_id, priority=PREFETCH)
+        except RequestException as http_err:
+            logging.debug(f'Prefetch of recipe {recipe_id} failed: {http_err}')
+        finally:
+            with self._lock:
+                self._pending.discard(recipe_id)
+
+    def prefetch(self, recipe_ids):
+        """Queue the recipe ids that are not already being fetched"""
+        for recipe_id in recipe_ids:
+            with self._lock:
+                if recipe_id in self._pending:
+                    continue
+                self._pending.add(recipe_id)
+            self._executor.submit(self._warm, recipe_id)
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,171 @@
+"""
+Request budget for the spoonacular API
+
+Spoonacular bills every request in points against a daily quota and
+throttles bursts. A RateLimiter hands out tokens from a token bucket
+before each request and keeps the points left reported by the quota
+headers. Requests are given a priority:
+    INTERACTIVE  recipe search and display, may wait briefly for a token
+    PRICE        price lookups of a cart save
+    PREFETCH     background warming of the cache
+lower priorities leave part of the bucket and of the daily quota to the
+higher ones and by default do not wait, a refused request is answered
+from stale cache data by the client. With a path the bucket lives in a
+SQLite file so every worker on the host draws from the same budget.
+"""
+
+# We will log to terminal refused requests
+import logging
+import threading
+import time
+
+# Workers share the bucket through a SQLite file
+from cache import SQLiteConnections
+
+INTERACTIVE = 0
+PRICE = 1
+PREFETCH = 2
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', PRICE: 'price', PREFETCH: 'prefetch'}
+
+# Share of the bucket a priority must leave untouched
+BUCKET_FLOORS = {INTERACTIVE: 0.0, PRICE: 0.25, PREFETCH: 0.5}
+
+# Multiples of the quota reserve a priority must leave untouched
+QUOTA_FLOORS = {INTERACTIVE: 0, PRICE: 1, PREFETCH: 2}
+
+# Spoonacular quotas are reset at midnight UTC
+DAY = 24 * 60 * 60
+
+
+class _MemoryState(object):
+    """Bucket state for a single process"""
+
+    def __init__(self, tokens):
+        self.state = {'tokens': tokens, 'updated': time.time(),
+                      'quota_left': None, 'quota_day': None}
+        self._lock = threading.Lock()
+
+    def update(self, func):
+        """Apply func(state) -> (state, result) atomically, return result"""
+        with self._lock:
+            self.state, result = func(dict(self.state))
+            return result
+
+
+class _SQLiteState(object):
+    """Bucket state in a SQLite file shared by the worker processes,
+    every update runs in an immediate transaction"""
+
+    def __init__(self, path, tokens, name='spoonacular', table='ratelimit'):
+        self.path = path
+        self.name = name
+        self.table = table
+        # Transactions are begun explicitly
+        self._connect = SQLiteConnections(path, isolation_level=None)
+        conn = self._connect()
+        with conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {table} (name TEXT PRIMARY KEY, '
+                         'tokens REAL, updated REAL, quota_left REAL, quota_day INTEGER)')
+            conn.execute(f'INSERT OR IGNORE INTO {table} VALUES (?, ?, ?, NULL, NULL)',
+                         (name, tokens, time.time()))
+
+    def update(self, func):
+        """Apply func(state) -> (state, result) atomically, return result"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(f'SELECT tokens, updated, quota_left, quota_day FROM {self.table} '
+                               'WHERE name = ?', (self.name,)).fetchone()
+            state, result = func(dict(zip(('tokens', 'updated', 'quota_left', 'quota_day'), row)))
+            conn.execute(f'UPDATE {self.table} SET tokens = ?, updated = ?, quota_left = ?, '
+                         'quota_day = ? WHERE name = ?',
+                         (state['tokens'], state['updated'], state['quota_left'],
+                          state['quota_day'], self.name))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return result
+
+
+class RateLimiter(object):
+    """RateLimiter
+    --
+    A token bucket of burst tokens refilled at rate tokens a second,
+    each request takes one token. quota_reserve is the number of daily
+    quota points kept for the higher priorities, see QUOTA_FLOORS.
+    Interactive requests wait up to max_wait seconds for a token, the
+    others background_wait seconds (batch jobs like warmup.py raise it)
+    """
+
+    def __init__(self, rate=5.0, burst=10, quota_reserve=10, max_wait=2.0, path=None,
+                 background_wait=0):
+        self.rate = rate
+        self.burst = burst
+        self.quota_reserve = quota_reserve
+        self.max_wait = max_wait
+        self.background_wait = background_wait
+        if path:
+            self.state = _SQLiteState(path, burst)
+        else:
+            self.state = _MemoryState(burst)
+        # Requests refused by priority name, in this process
+        self.refused = {}
+        self._lock = threading.Lock()
+
+    def _take(self, priority, now):
+        """Return a function taking a token for priority from the state,
+        its result is 0 on success or the seconds until a token is free"""
+        def take(state):
+            tokens = min(self.burst, state['tokens'] + (now - state['updated']) * self.rate)
+            state.update(tokens=tokens, updated=now)
+            # The quota seen on an earlier day no longer applies
+            if state['quota_day'] == int(now // DAY) and state['quota_left'] is not None:
+                if state['quota_left'] - 1 < self.quota_reserve * QUOTA_FLOORS[priority]:
+                    return state, None
+            needed = 1 + self.burst * BUCKET_FLOORS[priority]
+            if tokens >= needed:
+                state['tokens'] = tokens - 1
+                return state, 0
+            return state, (needed - tokens) / self.rate
+        return take
+
+    def acquire(self, priority=INTERACTIVE):
+        """acquire
+        --
+        Take a token for a request of priority, waiting up to max_wait
+        (or background_wait) seconds for one
+        return: True when the request may be sent
+        """
+        deadline = time.time() + (self.max_wait if priority == INTERACTIVE
+                                  else self.background_wait)
+        while True:
+            now = time.time()
+            wait = self.state.update(self._take(priority, now))
+            if wait == 0:
+                return True
+            if wait is None or now + wait > deadline:
+                break
+            time.sleep(wait)
+
+        name = PRIORITY_NAMES[priority]
+        with self._lock:
+            self.refused[name] = self.refused.get(name, 0) + 1
+        logging.warning(f'Spoonacular budget refused a {name} request')
+        return False
+
+    def record_quota(self, left):
+        """Keep the quota points left reported by spoonacular"""
+        def record(state):
+            state.update(quota_left=left, quota_day=int(time.time() // DAY))
+            return state, None
+        self.state.update(record)
+
+    def quota_left(self):
+        """Return the points left today or None when unknown"""
+        def read(state):
+            if state['quota_day'] != int(time.time() // DAY):
+                return state, None
+            return state, state['quota_left']
+        return self.state.update(read)
@@ -0,0 +1,83 @@
+"""
+Compact recipe search results
+
+A findByIngredients response carries the full used, missed and unused
+ingredient objects of every recipe (original names, meta, long units...)
+of which the page shows a handful of fields. Responses are projected to
+Recipe records as they arrive, so the cache, the search sessions and
+the callbacks only ever hold the fields that are rendered.
+"""
+
+# Bumped when the fields change, it is part of the cache key so
+# records pickled by an older version are not read back
+RECORD_VERSION = 2
+
+
+class _Record(object):
+    """Compares and prints by the fields named in __slots__"""
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f'{f}={getattr(self, f)!r}' for f in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class MissedIngredient(_Record):
+    """An ingredient of a recipe the user does not have"""
+
+    __slots__ = ('id', 'name', 'aisle', 'amount', 'unit')
+
+    def __init__(self, id, name, aisle, amount, unit):
+        self.id = id
+        self.name = name
+        self.aisle = aisle
+        self.amount = amount
+        self.unit = unit
+
+    def to_dict(self, recipe_id):
+        """The cart line data of this ingredient, the recipe id lets the
+        cart price it from the recipe price breakdown"""
+        return {'name': self.name, 'id': self.id, 'aisle': self.aisle,
+                'amount': self.amount, 'unit': self.unit, 'recipe_id': recipe_id}
+
+
+class Recipe(_Record):
+    """Recipe
+    --
+    The fields of a findByIngredients result iCook renders, and the
+    names of the used ingredients the results are ranked by
+    """
+
+    __slots__ = ('id', 'title', 'image', 'used_images', 'missed', 'missed_count',
+                 'used_names')
+
+    def __init__(self, id, title, image, used_images=(), missed=(), missed_count=0,
+                 used_names=()):
+        self.id = id
+        self.title = title
+        self.image = image
+        self.used_images = tuple(used_images)
+        self.missed = tuple(missed)
+        self.missed_count = missed_count
+        self.used_names = tuple(used_names)
+
+    @classmethod
+    def from_json(cls, data):
+        """Project one findByIngredients result"""
+        return cls(data['id'], data['title'], data.get('image'),
+                   [n['image'] for n in data.get('usedIngredients', [])],
+                   [MissedIngredient(n['id'], n['name'], n.get('aisle'), n['amount'], n['unit'])
+                    for n in data.get('missedIngredients', [])],
+                   data.get('missedIngredientCount', 0),
+                   [n['name'] for n in data.get('usedIngredients', [])])
+
+
+def compact_recipes(response):
+    """Project a findByIngredients response to a list of Recipe"""
+    return [Recipe.from_json(data) for data in response]
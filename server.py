@@ -0,0 +1,113 @@
+"""
+Serving iCook outside of the Flask development server
+
+Two ways to run the app in production:
+    gunicorn -c gunicorn.conf.py wsgi:application
+        several worker processes, each with a pool of threads (or gevent
+        greenlets), see gunicorn.conf.py for the settings
+    python iCook.py
+        a single process serving requests on a bounded pool of threads
+
+In both cases a slow spoonacular request only holds up its own thread,
+/healthz reports whether the instance should receive traffic and a
+SIGTERM lets the requests in flight finish before the process exits.
+"""
+
+# We will log to terminal startup and shutdown
+import logging
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+from werkzeug.serving import BaseWSGIServer
+
+# Set once the process has been asked to stop
+draining = threading.Event()
+
+
+def add_health_check(server):
+    """add_health_check
+    --
+    Serve /healthz on the Flask server, 200 while serving and
+    503 once a shutdown has started so load balancers stop routing to it
+    """
+    from flask import jsonify
+
+    @server.route('/healthz')
+    def healthz():
+        if draining.is_set():
+            return jsonify(status='draining'), 503
+        return jsonify(status='ok')
+
+
+def add_compression(server, algorithms=('br', 'gzip'), level=6, br_level=4, min_size=500):
+    """add_compression
+    --
+    Compress the responses of the Flask server with the first of
+    algorithms the browser accepts, brotli ('br') needs the brotli
+    package and is left out without it
+    return: the algorithms in use
+    """
+    from flask_compress import Compress
+
+    algorithms = [a for a in algorithms if a]
+    if 'br' in algorithms and find_spec('brotli') is None:
+        logging.info("brotli is not installed, responses are not compressed with it")
+        algorithms.remove('br')
+    if not algorithms:
+        return algorithms
+    server.config.update(COMPRESS_ALGORITHM=algorithms, COMPRESS_LEVEL=level,
+                         COMPRESS_BR_LEVEL=br_level, COMPRESS_MIN_SIZE=min_size)
+    Compress(server)
+    return algorithms
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """PooledWSGIServer
+    --
+    A werkzeug server handling each connection on a pool of at most
+    threads threads, rather than the unbounded thread per request of
+    the development server
+    """
+
+    def __init__(self, host, port, app, threads=8):
+        super().__init__(host, port, app)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+
+def serve(app, host='0.0.0.0', port=8050, threads=8, on_shutdown=None):
+    """serve
+    --
+    Serve the WSGI app until SIGTERM or SIGINT, then stop accepting
+    connections, wait for the requests in flight and call on_shutdown
+    """
+    httpd = PooledWSGIServer(host, port, app, threads=threads)
+
+    def stop(signum, frame):
+        logging.info(f"Received signal {signum}, shutting down")
+        draining.set()
+        # shutdown() waits for serve_forever so it can not run on this thread
+        threading.Thread(target=httpd.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logging.info(f"Serving on http://{host}:{port} with {threads} threads")
+    httpd.serve_forever()
+    httpd.pool.shutdown(wait=True)
+    httpd.server_close()
+    if on_shutdown is not None:
+        on_shutdown()
+    logging.info("Server stopped")
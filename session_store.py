@@ -0,0 +1,88 @@
+"""
+Server side storage of recipe search results
+
+The browser only keeps a session token (and the recipe index) while the
+search results stay on the server, so Skip does not post the whole
+result list back on every click. Results live in memory by default,
+a SQLite file or Redis server can be used to share them between workers.
+"""
+
+# We will log to terminal the chosen backend
+import logging
+import pickle
+import time
+import uuid
+
+from cache import MemoryBackend, SQLiteBackend
+
+# Seconds a search is kept after it was last stored
+SESSION_TTL = 60 * 60
+
+
+class RedisBackend(object):
+    """RedisBackend
+    --
+    Stores (expires, value) entries in any Redis compatible server,
+    the redis package is only needed when this backend is used
+    """
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        """Return the (expires, value) entry of key or None"""
+        data = self.redis.get(key)
+        if data is None:
+            return None
+        return pickle.loads(data)
+
+    def set(self, key, value, expires):
+        ttl = max(1, int(expires - time.time()))
+        self.redis.set(key, pickle.dumps((expires, value), pickle.HIGHEST_PROTOCOL), ex=ttl)
+
+
+class SessionStore(object):
+    """SessionStore
+    --
+    Maps a random session token to the data of one search
+    """
+
+    def __init__(self, backend=None, ttl=SESSION_TTL):
+        self.backend = backend if backend is not None else MemoryBackend(maxsize=4096)
+        self.ttl = ttl
+
+    def create(self, data):
+        """Store data under a new token and return the token"""
+        token = uuid.uuid4().hex
+        self.put(token, data)
+        return token
+
+    def put(self, token, data):
+        self.backend.set('session:' + token, data, time.time() + self.ttl)
+
+    def get(self, token):
+        """Return the data of token, None when it is unknown or expired"""
+        if not token:
+            return None
+        entry = self.backend.get('session:' + str(token))
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+
+def make_session_store(url=None, ttl=SESSION_TTL):
+    """make_session_store
+    --
+    Pick a backend from url, redis:// and rediss:// urls use Redis,
+    any other value is treated as a SQLite file path and no url
+    keeps the sessions in this process
+    """
+    if not url:
+        backend = MemoryBackend(maxsize=4096)
+    elif url.startswith(('redis://', 'rediss://')):
+        backend = RedisBackend(url)
+    else:
+        backend = SQLiteBackend(url, table='sessions')
+    logging.info(f"Storing search sessions in {type(backend).__name__}")
+    return SessionStore(backend, ttl)
@@ -0,0 +1,85 @@
+"""
+Single-flight calls
+
+Many users searching for the same ingredients, or opening the same
+popular recipe, at the same moment would each send an identical request
+to spoonacular. A SingleFlight lets the first caller for a key make the
+call while concurrent callers for that key wait for it and share its
+result (or its exception), so only one request is in flight per key.
+A call interrupted by a BaseException that is not an Exception, such as
+a gevent.Timeout of the caller that made it, is not shared, its waiters
+make the call again.
+"""
+
+import threading
+
+
+class _Call(object):
+    """A call in flight, done is set once result or error is known
+    or the call was abandoned"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class SingleFlight(object):
+    """SingleFlight
+    --
+    Coalesces concurrent calls with the same key within this process,
+    calls made after one has finished run again, caching is left to
+    the caller
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        # Number of calls answered by another caller's call
+        self.shared = 0
+
+    def in_flight(self):
+        """Return the number of keys with a call running"""
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key, func, *args, **kwargs):
+        """do
+        --
+        return: func(*args, **kwargs), or the result of the call already
+        running for key
+        raises: the exception of that call
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    self.shared += 1
+            if leader:
+                break
+            call.done.wait()
+            if call.abandoned:
+                # The caller making it was interrupted, try again
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as err:
+            call.error = err
+            raise
+        except BaseException:
+            call.abandoned = True
+            raise
+        finally:
+            # Later callers start a new call, waiters read this one
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,90 @@
+"""
+Cache snapshots
+
+A snapshot holds the fresh entries of a ResponseCache so a new instance
+starts warm without spending spoonacular quota again. The format is a
+header, MAGIC and a version byte, followed by a zlib stream of records
+    key length (2 bytes), expiry (8 byte float), value length (4 bytes),
+    the utf-8 key, the pickled value
+Values are unpickled on restore, only load snapshots you wrote. A value
+that no longer unpickles, say its class changed in a later deploy, is
+skipped.
+"""
+
+# We will log to terminal skipped records
+import logging
+import os
+import pickle
+import struct
+import zlib
+
+MAGIC = b'ICOOKSNAP'
+VERSION = 1
+
+RECORD = struct.Struct('<HdI')
+
+
+def write_snapshot(path, entries):
+    """write_snapshot
+    --
+    Write (key, expires, value) entries to path, the file is replaced
+    once the snapshot is complete
+    return: the number of entries written
+    """
+    compressor = zlib.compressobj(9)
+    count = 0
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as out:
+        out.write(MAGIC + bytes([VERSION]))
+        for key, expires, value in entries:
+            key = key.encode()
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            out.write(compressor.compress(RECORD.pack(len(key), expires, len(value))))
+            out.write(compressor.compress(key))
+            out.write(compressor.compress(value))
+            count += 1
+        out.write(compressor.flush())
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_snapshot(path):
+    """read_snapshot
+    --
+    Yield the (key, expires, value) entries of the snapshot at path,
+    skipping those whose value can not be unpickled
+    raises: ValueError when path is not a snapshot or is damaged
+    """
+    with open(path, 'rb') as snapshot:
+        header = snapshot.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC or header[len(MAGIC):] != bytes([VERSION]):
+            raise ValueError(f'{path} is not an iCook cache snapshot')
+        try:
+            data = zlib.decompress(snapshot.read())
+        except zlib.error as err:
+            raise ValueError(f'{path} is damaged: {err}')
+
+    offset = 0
+    skipped = 0
+    while offset < len(data):
+        try:
+            key_length, expires, value_length = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            key = data[offset:offset + key_length].decode()
+            offset += key_length
+        except (struct.error, UnicodeDecodeError) as err:
+            raise ValueError(f'{path} is damaged: {err}')
+        if offset + value_length > len(data):
+            raise ValueError(f'{path} is damaged: {key} is cut short')
+        try:
+            value = pickle.loads(data[offset:offset + value_length])
+        except Exception as err:
+            # Unpickling raises whatever the missing or changed class does
+            logging.debug(f'Skipping {key} of {path}: {err!r}')
+            skipped += 1
+            continue
+        finally:
+            offset += value_length
+        yield key, expires, value
+    if skipped:
+        logging.warning(f'Skipped {skipped} records of {path} that could not be unpickled')
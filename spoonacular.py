@@ -0,0 +1,305 @@
+"""
+Spoonacular API client shared by all of the iCook callbacks
+
+A single client holds a pooled keep-alive session so connections (and their
+TLS handshakes) are reused between callbacks, every request has a timeout,
+and throttled or failed requests are retried with jittered backoff.
+"""
+
+# We will log to terminal retries and quota usage
+import logging
+import random
+import threading
+import time
+from functools import partial
+
+# Responses are kept in a cache shared by every callback
+from cache import MISSING, make_key
+# Identical requests running at the same time are sent once
+from singleflight import SingleFlight
+# Recipe searches are kept as compact records
+from recipes import RECORD_VERSION, compact_recipes
+# Requests are sent within a budget, by priority
+from ratelimit import INTERACTIVE, PRICE, PRIORITY_NAMES
+# Searches are answered from the local catalog when it can
+from catalog import uses_all
+
+# requests library is used for HTTP GET requests
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, RequestException, Timeout
+
+API_URL = 'https://api.spoonacular.com'
+
+# Status codes that are worth another attempt, spoonacular answers
+# 429 when we are sending requests too quickly
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Spoonacular reports point usage on every response with these headers
+# https://spoonacular.com/food-api/docs#Quotas
+QUOTA_HEADERS = {'X-API-Quota-Request': 'request',
+                 'X-API-Quota-Used': 'used',
+                 'X-API-Quota-Left': 'left'}
+
+
+class BudgetExceeded(RequestException):
+    """Raised when the rate limiter refused a request and no stale
+    response is cached for it, priority is the one it was refused at"""
+
+    def __init__(self, *args, priority=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.priority = priority
+
+
+def shared_call(flights, key, priority, func, *args):
+    """shared_call
+    --
+    Call func(*args) through the singleflight.SingleFlight flights, a
+    call joined that the budget refused at a lower priority than priority
+    is made again, so a prefetch refusal is never handed to a user
+    """
+    while True:
+        try:
+            return flights.do(key, func, *args)
+        except BudgetExceeded as refused:
+            if refused.priority is None or refused.priority <= priority:
+                raise
+            logging.info(f'Retrying {key} refused at a lower priority')
+
+
+class SpoonacularClient(object):
+    """SpoonacularClient
+    --
+    Wraps the spoonacular endpoints used by iCook, responses are returned
+    as parsed json. Requests that still fail after all retries raise
+    a requests.exceptions.RequestException (HTTPError for bad statuses)
+    When a cache.ResponseCache is given successful responses are stored
+    in it and reused for identical queries, when a metrics.Metrics is given
+    the latency of every request is recorded by endpoint
+    Concurrent identical requests from any thread share one upstream call
+    When a ratelimit.RateLimiter is given every attempt of a request, its
+    retries included, needs a token for its priority, a refused request
+    is answered with an expired cached response or raises BudgetExceeded
+    When a catalog.RecipeCatalog is given every recipe and instructions
+    fetched are added to it, and searches and instructions are answered
+    from it first
+    """
+
+    def __init__(self, api_key, base_url=API_URL, timeout=5, retries=3,
+                 backoff=0.25, max_backoff=4, pool_size=16, cache=None,
+                 metrics=None, limiter=None, catalog=None):
+        self.api_key = api_key
+        self.cache = cache
+        self.metrics = metrics
+        self.limiter = limiter
+        self.catalog = catalog
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        # One pooled session for every thread of this worker
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Last seen quota values, updated from the response headers
+        self.quota = {}
+        self._quota_lock = threading.Lock()
+
+        # Requests in flight by cache key
+        self.flights = SingleFlight()
+
+    def _sleep(self, attempt, retry_after=None):
+        """Wait before the next attempt, honouring Retry-After when given
+        otherwise an exponential backoff with full jitter"""
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+        time.sleep(min(delay, self.max_backoff))
+
+    def _track_quota(self, response):
+        """Keep the most recent quota values reported by spoonacular"""
+        quota = {}
+        for header, key in QUOTA_HEADERS.items():
+            try:
+                quota[key] = float(response.headers[header])
+            except (KeyError, ValueError):
+                continue
+        if quota:
+            with self._quota_lock:
+                self.quota.update(quota)
+            if self.limiter is not None and 'left' in quota:
+                self.limiter.record_quota(quota['left'])
+            logging.debug(f"Spoonacular quota is {quota}")
+
+    def _send(self, endpoint, url, params):
+        """Send a single GET request, timing it when metrics are kept"""
+        if self.metrics is None:
+            return self.session.get(url, params=params, timeout=self.timeout)
+        with self.metrics.time('icook_upstream_seconds', endpoint=endpoint):
+            return self.session.get(url, params=params, timeout=self.timeout)
+
+    def _get(self, endpoint, path, params=None, priority=INTERACTIVE):
+        """Send a GET request to path and return the parsed json body,
+        every attempt (retries included) needs a token for priority"""
+        url = self.base_url + path
+        params = dict(params or {}, apiKey=self.api_key)
+
+        for attempt in range(self.retries + 1):
+            # Retries of throttled or failed requests are bursts too, they
+            # stop once the budget of the priority is spent
+            if self.limiter is not None and not self.limiter.acquire(priority):
+                raise BudgetExceeded(f'No budget left for a {PRIORITY_NAMES[priority]} '
+                                     f'{endpoint} request'
+                                     + (f' after {attempt} attempts' if attempt else ''),
+                                     priority=priority)
+            try:
+                response = self._send(endpoint, url, params)
+            except (ConnectionError, Timeout) as err:
+                if attempt == self.retries:
+                    raise
+                logging.warning(f'Retrying {path} after error: {err}')
+                self._sleep(attempt)
+                continue
+
+            self._track_quota(response)
+            # check that requests didn't receive api related errors:
+            # 401 status code
+            if response.status_code == 401:
+                logging.error("API Key related error")
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                logging.warning(f'Retrying {path} after status {response.status_code}')
+                try:
+                    retry_after = float(response.headers['Retry-After'])
+                except (KeyError, ValueError):
+                    retry_after = None
+                self._sleep(attempt, retry_after)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def _fetch(self, endpoint, key, path, params=None, priority=INTERACTIVE, project=None):
+        """Send the request and cache its response, within the budget,
+        project turns the parsed json into the value that is kept"""
+        try:
+            value = self._get(endpoint, path, params, priority)
+        except BudgetExceeded as err:
+            return self._stale(endpoint, key, err)
+        if project is not None:
+            value = project(value)
+        if self.cache is not None:
+            self.cache.set(endpoint, key, value)
+        return value
+
+    def _stale(self, endpoint, key, refused):
+        """Return the expired cached response of a request the budget
+        refused, re-raising refused when there is none"""
+        value = MISSING if self.cache is None else self.cache.get_stale(endpoint, key)
+        if value is MISSING:
+            raise refused
+        logging.info(f'Serving a stale {endpoint} response, over budget')
+        return value
+
+    def _cached_get(self, endpoint, key, path, params=None, priority=INTERACTIVE,
+                    project=None):
+        """Return the cached response for key, fetching it on a miss
+        or joining the identical request already in flight"""
+        if self.cache is not None:
+            value = self.cache.get(endpoint, key)
+            if value is not MISSING:
+                return value
+        return shared_call(self.flights, key, priority, self._fetch, endpoint, key, path,
+                           params, priority, project)
+
+    def autocomplete_ingredients(self, query, number=8):
+        """https://spoonacular.com/food-api/docs#Autocomplete-Ingredient-Search"""
+        query = query.strip().lower()
+        return self._cached_get('autocomplete', make_key('autocomplete', query, number),
+                                '/food/ingredients/autocomplete',
+                                {'query': query, 'number': number})
+
+    def _add_recipes(self, response):
+        """Catalog a findByIngredients response and keep it compact"""
+        if self.catalog is not None:
+            self.catalog.add_recipes(response)
+        return compact_recipes(response)
+
+    def find_by_ingredients(self, ingredients, number=30, priority=INTERACTIVE):
+        """https://spoonacular.com/food-api/docs#Search-Recipes-by-Ingredients
+        return: a list of recipes.Recipe"""
+        # Order and case of the ingredients do not change the result
+        ingredients = sorted({i.strip().lower() for i in ingredients})
+        if self.catalog is None:
+            return self._search(ingredients, number, priority)
+
+        local = self.catalog.search(ingredients, number)
+        # Recipes using only some of the ingredients are not an answer
+        # unless the API was asked for these ingredients before
+        if (len(local) >= number and all(uses_all(r, ingredients) for r in local)) \
+                or self.catalog.searched(ingredients) >= number:
+            self.catalog.found()
+            return local
+        try:
+            found = self._search(ingredients, number, priority)
+        except RequestException as http_err:
+            if not local:
+                raise
+            logging.warning(f'Searching the catalog only, the API failed: {http_err}')
+            self.catalog.found()
+            return local
+        self.catalog.add_search(ingredients, number)
+        # Fill the gaps of the API results with the catalog, ranked by
+        # most used then fewest missed ingredients
+        ids = {r.id for r in found}
+        recipes = found + [r for r in local if r.id not in ids]
+        recipes.sort(key=lambda r: (-len(r.used_names), r.missed_count))
+        return recipes[:number]
+
+    def _search(self, ingredients, number, priority):
+        return self._cached_get('findByIngredients',
+                                make_key('findByIngredients', ingredients, number,
+                                         RECORD_VERSION),
+                                '/recipes/findByIngredients',
+                                {'ingredients': ','.join(ingredients), 'number': number},
+                                priority, self._add_recipes)
+
+    def _add_instructions(self, recipe_id, steps):
+        """Catalog the instructions of a recipe"""
+        self.catalog.add_instructions(recipe_id, steps)
+        return steps
+
+    def analyzed_instructions(self, recipe_id, priority=INTERACTIVE):
+        """https://spoonacular.com/food-api/docs#Get-Analyzed-Recipe-Instructions"""
+        project = None
+        if self.catalog is not None:
+            steps = self.catalog.instructions(recipe_id)
+            if steps is not None:
+                return steps
+            project = partial(self._add_instructions, recipe_id)
+        return self._cached_get('analyzedInstructions',
+                                make_key('analyzedInstructions', recipe_id),
+                                f'/recipes/{recipe_id}/analyzedInstructions',
+                                {'stepBreakdown': 'true'}, priority, project)
+
+    def ingredient_information(self, ingredient_id, amount=None, unit=None, priority=PRICE):
+        """https://spoonacular.com/food-api/docs#Get-Ingredient-Information"""
+        params = {}
+        if amount is not None:
+            params['amount'] = amount
+        if unit:
+            params['unit'] = unit
+        return self._cached_get('ingredientInformation',
+                                make_key('ingredientInformation', ingredient_id, amount, unit),
+                                f'/food/ingredients/{ingredient_id}/information', params,
+                                priority)
+
+    def price_breakdown(self, recipe_id, priority=PRICE):
+        """https://spoonacular.com/food-api/docs#Get-Recipe-Price-Breakdown-by-ID"""
+        return self._cached_get('priceBreakdown', make_key('priceBreakdown', recipe_id),
+                                f'/recipes/{recipe_id}/priceBreakdownWidget.json',
+                                None, priority)
+
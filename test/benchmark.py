@@ -0,0 +1,180 @@
+"""
+Offline benchmark of the iCook callbacks
+
+Starts the mock spoonacular server and the iCook Dash server, then sends
+callback requests over HTTP from a pool of concurrent clients and reports
+the throughput and p50/p95/p99 latency of each callback.
+
+    $ python test/benchmark.py --concurrency 8 --requests 200 --latency 0.05
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from mock_spoonacular import INGREDIENTS, start_mock_server
+
+# Outputs of each callback as listed in its @app.callback decorator
+RECIPE_OUTPUTS = ['recipe_sub.style', 'recipe-title.children', 'recipe-img.src',
+                  'recipe-ingredients.children', 'missing-ingredients.data',
+                  'save-missing.children', 'cached-recipes.data',
+                  'current-recipe-count.children', 'ingredients-dropdown.value']
+CART_OUTPUTS = ['shopping-sub.style', 'shopping-list.children', 'cart.data']
+
+
+def prop(id_prop, value=None):
+    component, name = id_prop.split('.', 1)
+    return {'id': component, 'property': name, 'value': value}
+
+
+def callback_payload(outputs, inputs, state, changed):
+    """The json body the Dash renderer posts to /_dash-update-component"""
+    if len(outputs) == 1:
+        output = outputs[0]
+        output_props = prop(outputs[0])
+    else:
+        output = '..' + '...'.join(outputs) + '..'
+        output_props = [prop(o) for o in outputs]
+    for item in output_props if isinstance(output_props, list) else [output_props]:
+        item.pop('value')
+    return {'output': output, 'outputs': output_props,
+            'inputs': [prop(k, v) for k, v in inputs],
+            'state': [prop(k, v) for k, v in state],
+            'changedPropIds': [changed]}
+
+
+def autocomplete_payload(i):
+    name = INGREDIENTS[i % len(INGREDIENTS)]
+    query = name[:1 + i % len(name)]
+    return callback_payload(['ingredients-dropdown.options'],
+                            [('ingredients-dropdown.search_value', query)],
+                            [('ingredients-dropdown.value', None),
+                             ('client-id.data', f'benchmark-{i}')],
+                            'ingredients-dropdown.search_value')
+
+
+def recipe_payload(i, skip=False, token=None, index=0):
+    now = int(time.time() * 1000)
+    ingredients = [INGREDIENTS[i % len(INGREDIENTS)], INGREDIENTS[(i * 7) % len(INGREDIENTS)]]
+    return callback_payload(RECIPE_OUTPUTS,
+                            [('search-recipe.n_clicks_timestamp', now - 1 if skip else now),
+                             ('skip-recipe.n_clicks_timestamp', now if skip else 1),
+                             ('clear-ingredients.n_clicks_timestamp', 1)],
+                            [('ingredients-dropdown.value', ingredients),
+                             ('current-recipe-count.children', index),
+                             ('cached-recipes.data', token)],
+                            'skip-recipe.n_clicks_timestamp' if skip
+                            else 'search-recipe.n_clicks_timestamp')
+
+
+def cart_payload(missing):
+    now = int(time.time() * 1000)
+    return callback_payload(CART_OUTPUTS,
+                            [('save-missing.n_clicks_timestamp', now),
+                             ('empty-cart.n_clicks_timestamp', 1)],
+                            [('cart.data', None), ('missing-ingredients.data', missing)],
+                            'save-missing.n_clicks_timestamp')
+
+
+class Session(object):
+    """One simulated user, a search followed by skips and a cart save"""
+
+    def __init__(self, url, i):
+        self.url = url + '/_dash-update-component'
+        self.http = requests.Session()
+        self.i = i
+
+    def post(self, payload):
+        start = time.perf_counter()
+        response = self.http.post(self.url, json=payload)
+        elapsed = time.perf_counter() - start
+        if response.status_code == 204:
+            return elapsed, None
+        response.raise_for_status()
+        return elapsed, response.json()['response']
+
+    def run(self, timings):
+        elapsed, _ = self.post(autocomplete_payload(self.i))
+        timings['populate_ingredient_options'].append(elapsed)
+        elapsed, response = self.post(recipe_payload(self.i))
+        timings['generate_recipies (search)'].append(elapsed)
+        if response is None:
+            # No recipes, the search was refused by the request budget
+            return
+        token = response['cached-recipes']['data']
+        missing = response['missing-ingredients']['data']
+        for index in range(2):
+            elapsed, response = self.post(recipe_payload(self.i, True, token, index))
+            timings['generate_recipies (skip)'].append(elapsed)
+        elapsed, _ = self.post(cart_payload(missing))
+        timings['save_to_cart'].append(elapsed)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def report(timings, wall):
+    total = sum(len(v) for v in timings.values())
+    print(f'{total} requests in {wall:.2f}s, {total / wall:.1f} requests/s')
+    print(f'{"callback":32} {"n":>5} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"mean ms":>8}')
+    for name, values in timings.items():
+        if not values:
+            continue
+        print(f'{name:32} {len(values):5d} {percentile(values, 0.5) * 1000:8.1f} '
+              f'{percentile(values, 0.95) * 1000:8.1f} {percentile(values, 0.99) * 1000:8.1f} '
+              f'{statistics.mean(values) * 1000:8.1f}')
+
+
+def start_app():
+    """Serve iCook on a background thread, return its base url"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from werkzeug.serving import make_server
+    import iCook
+    server = make_server('127.0.0.1', 0, iCook.create_app().server, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=100,
+                        help='number of simulated user sessions (5 requests each)')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='mean latency of the mock spoonacular server')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='spoonacular requests a second iCook may send, 0 for no limit')
+    args = parser.parse_args()
+
+    mock, mock_url = start_mock_server(latency=args.latency, error_rate=args.error_rate)
+    os.environ['ICOOK_KEY'] = 'benchmark'
+    os.environ['ICOOK_API_URL'] = mock_url
+    os.environ['ICOOK_RATE_LIMIT'] = str(args.rate_limit)
+    app_server, url = start_app()
+
+    timings = {'populate_ingredient_options': [], 'generate_recipies (search)': [],
+               'generate_recipies (skip)': [], 'save_to_cart': []}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(Session(url, i).run, timings) for i in range(args.requests)]
+        for future in futures:
+            future.result()
+    report(timings, time.perf_counter() - start)
+    print(f'{mock.requests} requests reached the mock spoonacular server')
+    app_server.shutdown()
+    import iCook
+    iCook.shutdown(app_server.app)
+    mock.shutdown()
+
+
+if __name__ == '__main__':
+    main()
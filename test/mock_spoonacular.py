@@ -0,0 +1,172 @@
+"""
+A local stand in for the spoonacular API
+
+Serves the endpoints iCook uses with generated but deterministic data,
+a configurable latency and error rate, so the app can be tested and
+benchmarked without a network connection or API quota.
+
+    $ python test/mock_spoonacular.py --port 8081 --latency 0.1 --error-rate 0.05
+    $ ICOOK_KEY=1 ICOOK_API_URL=http://localhost:8081 python iCook.py
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+INGREDIENTS = ['apple', 'bacon', 'baking powder', 'banana', 'basil', 'bread flour',
+               'butter', 'carrots', 'cheddar cheese', 'chicken breast', 'chicken stock',
+               'egg', 'egg yolk', 'eggplant', 'flour', 'garlic', 'honey', 'lemon',
+               'milk', 'olive oil', 'onion', 'potato', 'rice', 'salt', 'sugar',
+               'tomato', 'vanilla extract']
+AISLES = ['Produce', 'Baking', 'Spices and Seasonings', 'Milk, Eggs, Other Dairy',
+          'Meat', 'Canned and Jarred']
+
+
+def ingredient_id(name):
+    """A stable id for an ingredient name"""
+    return zlib.crc32(name.encode()) % 100000
+
+
+def ingredient(name, amount=1.0, unit='cup'):
+    """An ingredient shaped like those in a findByIngredients response"""
+    return {'id': ingredient_id(name), 'name': name, 'original': f'{amount} {unit} {name}',
+            'originalName': name, 'aisle': AISLES[ingredient_id(name) % len(AISLES)],
+            'amount': amount, 'unit': unit, 'unitLong': unit + 's', 'meta': [],
+            'image': f'https://spoonacular.com/cdn/ingredients_100x100/{name}.jpg'}
+
+
+def recipe_ingredients(recipe_id):
+    """The ingredients a recipe may be missing, stable for its id"""
+    return random.Random(recipe_id).sample(INGREDIENTS, 8)
+
+
+def find_by_ingredients(params):
+    names = [n.strip() for n in params.get('ingredients', [''])[0].split(',') if n.strip()]
+    # spoonacular returns at most 100 recipes
+    number = min(int(params.get('number', ['10'])[0]), 100)
+    seed = zlib.crc32(','.join(sorted(names)).encode())
+    recipes = []
+    for i in range(number):
+        recipe_id = (seed + i) % 1000000
+        rng = random.Random(recipe_id)
+        missed = [n for n in recipe_ingredients(recipe_id) if n not in names][:3]
+        recipes.append({
+            'id': recipe_id, 'title': f'Recipe {i} with {" and ".join(names)}',
+            'image': f'https://spoonacular.com/recipeImages/{i}-312x231.jpg',
+            'imageType': 'jpg', 'likes': rng.randint(0, 100),
+            'usedIngredientCount': len(names), 'missedIngredientCount': len(missed),
+            'usedIngredients': [ingredient(n, rng.randint(1, 4)) for n in names],
+            'missedIngredients': [ingredient(n, rng.randint(1, 4)) for n in missed],
+            'unusedIngredients': []})
+    return recipes
+
+
+def autocomplete(params):
+    query = params.get('query', [''])[0].lower()
+    # spoonacular returns at most 100 recipes
+    number = min(int(params.get('number', ['10'])[0]), 100)
+    return [{'name': n, 'image': n + '.jpg'} for n in INGREDIENTS if query in n][:number]
+
+
+def analyzed_instructions(recipe_id):
+    return [{'name': '', 'steps': [{'number': n, 'step': f'Step {n} of recipe {recipe_id}.'}
+                                   for n in range(1, 6)]}]
+
+
+def ingredient_information(ingredient_id, params):
+    amount = float(params.get('amount', ['1'])[0])
+    return {'id': int(ingredient_id), 'estimatedCost': {'value': round(amount * 25.5, 2),
+                                                        'unit': 'US Cents'}}
+
+
+def price_breakdown(recipe_id):
+    return {'ingredients': [{'name': n, 'price': 30.0 + i,
+                             'amount': {'us': {'value': 1.0, 'unit': 'cup'}}}
+                            for i, n in enumerate(recipe_ingredients(recipe_id))],
+            'totalCost': 300.0, 'totalCostPerServing': 75.0}
+
+
+ROUTES = [
+    (re.compile(r'^/food/ingredients/autocomplete$'), lambda m, p: autocomplete(p)),
+    (re.compile(r'^/recipes/findByIngredients$'), lambda m, p: find_by_ingredients(p)),
+    (re.compile(r'^/recipes/(\d+)/analyzedInstructions$'),
+     lambda m, p: analyzed_instructions(int(m.group(1)))),
+    (re.compile(r'^/food/ingredients/(\d+)/information$'),
+     lambda m, p: ingredient_information(m.group(1), p)),
+    (re.compile(r'^/recipes/(\d+)/priceBreakdownWidget.json$'),
+     lambda m, p: price_breakdown(int(m.group(1)))),
+]
+
+
+class MockSpoonacularHandler(BaseHTTPRequestHandler):
+    """Answers the spoonacular endpoints, see ROUTES"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-API-Quota-Request', '1')
+        self.send_header('X-API-Quota-Used', str(self.server.requests))
+        self.send_header('X-API-Quota-Left', str(max(0, 150 - self.server.requests)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        with self.server.lock:
+            self.server.requests += 1
+        latency = self.server.latency
+        if latency:
+            time.sleep(random.uniform(0.5 * latency, 1.5 * latency))
+        if 'apiKey' not in params:
+            return self.send_json(401, {'status': 'failure', 'message': 'missing apiKey'})
+        if random.random() < self.server.error_rate:
+            return self.send_json(503, {'status': 'failure', 'message': 'injected error'})
+        for pattern, handler in ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                return self.send_json(200, handler(match, params))
+        self.send_json(404, {'status': 'failure', 'message': 'unknown endpoint'})
+
+
+def start_mock_server(port=0, latency=0.0, error_rate=0.0):
+    """start_mock_server
+    --
+    Serve the mock api on a background thread
+    return: the server (call shutdown() to stop it) and its base url
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockSpoonacularHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='mean seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests answered with a 503')
+    args = parser.parse_args()
+    server, url = start_mock_server(args.port, args.latency, args.error_rate)
+    print(f'Mock spoonacular serving on {url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
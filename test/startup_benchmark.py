@@ -0,0 +1,59 @@
+"""
+Startup time benchmark
+
+Measures, in fresh interpreters as a new worker would be, the time to
+import iCook, to build the app with create_app and to answer the first
+request, so regressions in cold start time are noticed.
+
+    $ python test/startup_benchmark.py --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in each fresh interpreter, prints the timings as json
+PROBE = '''
+import json, time
+start = time.perf_counter()
+import iCook
+imported = time.perf_counter()
+app = iCook.create_app({'api_key': 'startup-benchmark'})
+created = time.perf_counter()
+app.server.test_client().get('/healthz')
+served = time.perf_counter()
+print(json.dumps({'import iCook': imported - start,
+                  'create_app': created - imported,
+                  'first request': served - created,
+                  'total': served - start}))
+'''
+
+
+def run_once():
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                            check=True, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL).stdout
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    print(f'{"phase":16} {"min ms":>8} {"median ms":>10} {"max ms":>8}')
+    for phase in runs[0]:
+        values = [run[phase] * 1000 for run in runs]
+        print(f'{phase:16} {min(values):8.1f} {statistics.median(values):10.1f} '
+              f'{max(values):8.1f}')
+
+
+if __name__ == '__main__':
+    main()
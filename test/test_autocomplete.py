@@ -0,0 +1,81 @@
+"""
+Test the debounced and coalesced autocomplete
+"""
+
+import threading
+import unittest
+from unittest import mock
+# Import module to be tested
+from autocomplete import AutocompleteCoalescer, Superseded
+
+
+def answer(*names):
+    return [{'name': name} for name in names]
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the autocomplete coalescer"""
+
+    def test_case_1(self):
+        """Test a complete shorter prefix answers longer queries locally"""
+        fetch = mock.Mock(return_value=answer('chicken', 'chicken breast', 'chickpeas'))
+        coalescer = AutocompleteCoalescer(fetch, number=8, debounce=0)
+        coalescer.search('chi')
+        self.assertEqual(coalescer.search('Chicken'), answer('chicken', 'chicken breast'))
+        self.assertEqual(fetch.call_count, 1)
+
+        # A truncated answer may be missing matches so it is not reused
+        fetch.return_value = answer(*('salt %d' % i for i in range(8)))
+        coalescer.search('sa')
+        coalescer.search('sal')
+        self.assertEqual(fetch.call_count, 3)
+
+    def test_case_2(self):
+        """Test concurrent identical queries share one request"""
+        release = threading.Event()
+
+        def fetch(query, number):
+            release.wait(5)
+            return answer('onion')
+
+        fetch = mock.Mock(side_effect=fetch)
+        coalescer = AutocompleteCoalescer(fetch, debounce=0)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(coalescer.search('onion')))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        # Let every thread reach the shared request before answering it
+        while coalescer.flights.in_flight() == 0:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(results, [answer('onion')] * 4)
+
+    def test_case_3(self):
+        """Test a query replaced during the debounce is dropped"""
+        fetch = mock.Mock(return_value=answer('chicken'))
+        coalescer = AutocompleteCoalescer(fetch, debounce=0.2)
+        errors = []
+
+        def first():
+            try:
+                coalescer.search('ch', client_id='browser')
+            except Superseded:
+                errors.append('ch')
+
+        thread = threading.Thread(target=first)
+        thread.start()
+        # Wait for the first query to be numbered before typing the next
+        while coalescer._counter == 0:
+            pass
+        self.assertEqual(coalescer.search('chick', client_id='browser'), answer('chicken'))
+        thread.join()
+        self.assertEqual(errors, ['ch'])
+        self.assertEqual([c.args[0] for c in fetch.call_args_list], ['chick'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Test the spoonacular response cache
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+# Import module to be tested
+import cache
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the response cache"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_case_1(self):
+        """Test keys ignore ingredient order and case"""
+        self.assertEqual(cache.make_key('findByIngredients', ['Flour', ' egg'], 30),
+                         cache.make_key('findByIngredients', ['egg', 'flour'], 30))
+
+    def test_case_2(self):
+        """Test the LRU evicts the oldest entry and expired entries miss"""
+        responses = cache.ResponseCache(maxsize=2, ttls={'autocomplete': -1})
+        responses.set('analyzedInstructions', 'a', 1)
+        responses.set('analyzedInstructions', 'b', 2)
+        responses.get('analyzedInstructions', 'a')
+        responses.set('analyzedInstructions', 'c', 3)
+        self.assertIs(responses.get('analyzedInstructions', 'b'), cache.MISSING)
+        self.assertEqual(responses.get('analyzedInstructions', 'a'), 1)
+        responses.set('autocomplete', 'egg', [])
+        self.assertIs(responses.get('autocomplete', 'egg'), cache.MISSING)
+        # An expired value is still there for when no request can be sent
+        self.assertEqual(responses.get_stale('autocomplete', 'egg'), [])
+        self.assertIs(responses.get_stale('autocomplete', 'salt'), cache.MISSING)
+        self.assertEqual(responses.stats()['analyzedInstructions'],
+                         {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3, 'stale': 0})
+
+    def test_case_3(self):
+        """Test two caches share entries through the SQLite backend"""
+        first = cache.ResponseCache(path=self.path)
+        second = cache.ResponseCache(path=self.path)
+        first.set('findByIngredients', 'egg', [{'id': 1}])
+        self.assertEqual(second.get('findByIngredients', 'egg'), [{'id': 1}])
+        self.assertGreater(second.memory.get('egg')[0], time.time())
+
+    def test_case_4(self):
+        """Test expired SQLite entries are purged after their grace period"""
+        disk = cache.SQLiteBackend(self.path, grace=60, purge_interval=0)
+        disk.set('old', 1, time.time() - 120)
+        disk.set('stale', 2, time.time() - 30)
+        disk.set('fresh', 3, time.time() + 30)
+        self.assertEqual(sorted(key for key, _, _ in disk.items()), ['fresh', 'stale'])
+        self.assertEqual(disk.purge(), 0)
+
+    def test_case_5(self):
+        """Test each thread gets its own WAL mode connection"""
+        connect = cache.SQLiteConnections(self.path, isolation_level=None)
+        conn = connect()
+        self.assertIs(connect(), conn)
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertIsNone(conn.isolation_level)
+        other = []
+        thread = threading.Thread(target=lambda: other.append(connect()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Test merging ingredients into the shopping cart
+"""
+
+import unittest
+# Import module to be tested
+import cart
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the cart lines"""
+
+    def setUp(self):
+        self.flour = {'name': 'flour', 'id': 20081, 'aisle': 'Baking',
+                      'amount': 1, 'unit': 'cups'}
+
+    def tearDown(self):
+        pass
+
+    def test_case_1(self):
+        """Test units are converted to millilitres or grams"""
+        self.assertEqual(cart.normalize_unit(2, 'Tablespoons'), (2 * 14.7868, 'ml'))
+        self.assertEqual(cart.normalize_unit(1, 'lbs'), (453.592, 'g'))
+        self.assertEqual(cart.normalize_unit(3, 'large'), (3.0, 'large'))
+
+    def test_case_2(self):
+        """Test the same ingredient merges into one line and a priced line
+        is scaled instead of priced again"""
+        lines = {}
+        self.assertEqual(cart.merge_cart(lines, [self.flour]), ['20081'])
+        lines['20081']['cost'] = 50.0
+        tbsp = dict(self.flour, amount=8, unit='tbsp')
+        self.assertEqual(cart.merge_cart(lines, [tbsp]), [])
+        self.assertEqual(len(lines), 1)
+        self.assertAlmostEqual(lines['20081']['amount'], 236.588 + 8 * 14.7868)
+        self.assertAlmostEqual(lines['20081']['cost'], 50.0 * lines['20081']['amount'] / 236.588)
+
+    def test_case_3(self):
+        """Test incompatible units get their own line and old list carts load"""
+        lines = cart.load_cart([dict(self.flour, cost=10.0),
+                                dict(self.flour, unit='servings', cost=5.0)])
+        self.assertEqual(sorted(lines), ['20081', '20081:servings'])
+        self.assertEqual(cart.make_cart(lines.values()).total, 15.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Test the local recipe catalog and offline search
+"""
+
+import os
+import tempfile
+import unittest
+# Import module to be tested
+import catalog
+import spoonacular
+from test.mock_spoonacular import start_mock_server
+
+
+def result(recipe_id, used, missed):
+    """A findByIngredients result using and missing the named ingredients"""
+    def line(i, name):
+        return {'id': recipe_id * 100 + i, 'name': name, 'aisle': 'Baking', 'amount': 1,
+                'unit': 'cup', 'image': f'{name}.jpg'}
+    return {'id': recipe_id, 'title': f'Recipe {recipe_id}', 'image': f'{recipe_id}.jpg',
+            'usedIngredients': [line(i, n) for i, n in enumerate(used)],
+            'missedIngredients': [line(i + len(used), n) for i, n in enumerate(missed)],
+            'missedIngredientCount': len(missed)}
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the recipe catalog"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'catalog.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_case_1(self):
+        """Test recipes are ranked by used then missed ingredients of the search"""
+        recipes = catalog.RecipeCatalog(self.path)
+        recipes.add_recipes([result(1, ['egg'], ['milk', 'salt']),
+                             result(2, ['egg'], ['flour']),
+                             result(3, ['milk'], ['sugar'])])
+        # A later search has other used ingredients
+        recipes.add_recipes([result(4, ['flour', 'sugar'], ['eggs'])])
+        found = catalog.RecipeCatalog(self.path).search(['egg', 'Flour'], 10)
+        self.assertEqual([r.id for r in found], [2, 4, 1])
+        self.assertEqual(found[0].used_names, ('egg', 'flour'))
+        self.assertEqual([m.name for m in found[2].missed], ['milk', 'salt'])
+        self.assertEqual(found[2].missed[0].to_dict(1)['recipe_id'], 1)
+        self.assertEqual(len(recipes.search(['egg'], 1)), 1)
+
+    def test_case_2(self):
+        """Test searches and instructions are answered offline once catalogued"""
+        server, url = start_mock_server()
+        client = spoonacular.SpoonacularClient('key', base_url=url, retries=0,
+                                               catalog=catalog.RecipeCatalog(self.path))
+        try:
+            recipes = client.find_by_ingredients(['egg', 'flour'], number=3)
+            steps = client.analyzed_instructions(recipes[0].id)
+            requests = server.requests
+            self.assertEqual(client.find_by_ingredients(['flour', 'egg'], number=3), recipes)
+            self.assertEqual(client.analyzed_instructions(recipes[0].id), steps)
+            self.assertEqual(server.requests, requests)
+        finally:
+            server.shutdown()
+            server.server_close()
+        # The API is down, more recipes than catalogued are asked for
+        self.assertEqual(client.find_by_ingredients(['egg', 'flour'], number=5), recipes)
+        self.assertEqual(client.catalog.hits, {'search': 2, 'instructions': 1})
+        client.session.close()
+
+    def test_case_3(self):
+        """Test recipes using only some of the ingredients do not answer a search"""
+        server, url = start_mock_server()
+        client = spoonacular.SpoonacularClient('key', base_url=url, retries=0,
+                                               catalog=catalog.RecipeCatalog(self.path))
+        try:
+            client.find_by_ingredients(['egg'], number=5)
+            recipes = client.find_by_ingredients(['egg', 'rice'], number=5)
+            self.assertEqual(server.requests, 2)
+            self.assertTrue(all(r.used_names == ('egg', 'rice') for r in recipes))
+            # Both searches were asked of the API before
+            self.assertEqual(client.find_by_ingredients(['rice', 'egg'], number=5), recipes)
+            self.assertEqual(len(client.find_by_ingredients(['egg'], number=3)), 3)
+            self.assertEqual(server.requests, 2)
+            # The next page needs the API
+            self.assertEqual(len(client.find_by_ingredients(['egg', 'rice'], number=10)), 10)
+            self.assertEqual(server.requests, 3)
+        finally:
+            server.shutdown()
+            server.server_close()
+            client.session.close()
+        self.assertEqual(client.catalog.searched(['Rice', 'egg']), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+Test the rendered recipe fragments
+"""
+
+import json
+import unittest
+# Import module to be tested
+import dash_html_components as html
+from plotly.utils import PlotlyJSONEncoder
+from fragments import FragmentCache, render_recipe
+from recipes import Recipe
+
+STEPS = [{'steps': [{'step': 'Mix'}, {'step': 'Bake'}]}]
+
+
+def as_json(value):
+    """The json Dash sends for a callback output"""
+    return json.loads(json.dumps(value, cls=PlotlyJSONEncoder))
+
+
+class TestTemplate(unittest.TestCase):
+    """Test rendering recipes as plain dicts"""
+
+    def test_case_1(self):
+        """Test a fragment is sent like the dash components it replaces"""
+        recipe = Recipe(1, 'Pie', 'pie.jpg', ['egg.jpg'])
+        fragment = render_recipe(recipe, STEPS)
+        self.assertEqual(as_json(fragment['title']), as_json(html.H4('Pie')))
+        self.assertEqual(as_json(fragment['ingredients']),
+                         as_json([html.Img(src='egg.jpg'), html.H5('Steps:'),
+                                  html.Ol([html.Li(children='Mix'), html.Li(children='Bake')])]))
+        self.assertEqual(len(render_recipe(recipe, [])['ingredients']), 1)
+
+    def test_case_2(self):
+        """Test fragments are kept by recipe and used ingredients"""
+        fragments = FragmentCache()
+        recipe = Recipe(1, 'Pie', 'pie.jpg', ['egg.jpg'])
+        fragments.set(recipe, render_recipe(recipe, STEPS))
+        self.assertEqual(fragments.get(Recipe(1, 'Pie', 'pie.jpg', ['egg.jpg'])),
+                         render_recipe(recipe, STEPS))
+        self.assertIsNone(fragments.get(Recipe(1, 'Pie', 'pie.jpg', ['flour.jpg'])))
+
+
+if __name__ == '__main__':
+    unittest.main()
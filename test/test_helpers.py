@@ -3,10 +3,12 @@ Test url path handling and generation
 """
 
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from requests.exceptions import HTTPError
 # Import module to be tested
 import iCook
-# Pandas is needed for checking data types
-import pandas
+from cart import Cart
 
 
 class TestTemplate(unittest.TestCase):
@@ -20,7 +22,7 @@ class TestTemplate(unittest.TestCase):
 
     def test_case_1(self):
         """Test the cart function
-        correctly return a dataframe, name, aisle and cost
+        correctly return a cart, name, aisle and cost
         """
         ingredient_dict = [{'name': 'bread flour',
                             'id': 10120129,
@@ -34,9 +36,8 @@ class TestTemplate(unittest.TestCase):
                             'amount': 4.25,
                             'unit': 'cups',
                             'cost': 0.24}]
-        # returns type pandas.core.frame.DataFrame
-        self.assertEqual(type(iCook.make_cart(ingredient_dict)),
-                         pandas.core.frame.DataFrame)
+        # returns type cart.Cart
+        self.assertEqual(type(iCook.make_cart(ingredient_dict)), Cart)
         self.assertEqual(iCook.make_cart(
             ingredient_dict).at[0, 'name'], 'bread flour')
         self.assertEqual(iCook.make_cart(
@@ -47,6 +48,81 @@ class TestTemplate(unittest.TestCase):
         self.assertEqual(iCook.make_cart(
             ingredient_dict).at['Total', 'cost'], 0.98)
 
+        # Check the table records and the aisle subtotals
+        cart = iCook.make_cart(ingredient_dict)
+        self.assertEqual(cart.columns, ['name', 'aisle', 'cost'])
+        self.assertEqual(cart.to_dict('records')[-1],
+                         {'name': 'Total', 'aisle': '', 'cost': 0.98})
+        self.assertEqual(cart.subtotals, {'Baking': 0.74, 'Vegetable': 0.24})
+
+    def test_case_2(self):
+        """Test the concurrent price lookup
+        successful lookups keep their price, failed lookups cost 0.00
+        """
+        ingredients = [{'name': 'bread flour', 'id': 10120129, 'amount': 4.25},
+                       {'name': 'carrots', 'id': 10120, 'amount': 2}]
+
+        def fake_price(client, ingredient):
+            if ingredient['id'] == 10120:
+                raise HTTPError('402 Client Error')
+            return 74.0
+
+        with mock.patch.object(iCook, 'fetch_ingredient_price', fake_price), \
+                ThreadPoolExecutor(max_workers=2) as executor:
+            iCook.price_ingredients(None, ingredients, executor)
+        self.assertEqual(ingredients[0]['cost'], 74.0)
+        self.assertEqual(ingredients[1]['cost'], 0.00)
+
+    def test_case_3(self):
+        """Test the price breakdown prices ingredients by name
+        and leaves unmatched ingredients for a per ingredient lookup
+        """
+        ingredients = [{'name': 'egg', 'id': 1123, 'recipe_id': 7},
+                       {'name': 'saffron', 'id': 2037, 'recipe_id': 7}]
+        breakdown = {'ingredients': [{'name': 'eggs', 'price': 45.0},
+                                     {'name': 'butter', 'price': 20.0}]}
+        client = mock.Mock()
+        client.price_breakdown.return_value = breakdown
+        iCook.price_from_breakdown(client, ingredients)
+        client.price_breakdown.assert_called_once_with(7)
+        self.assertEqual(ingredients[0]['cost'], 45.0)
+        self.assertNotIn('cost', ingredients[1])
+
+    def test_case_4(self):
+        """Test the config is read from the environment and checked"""
+        with self.assertRaises(iCook.ConfigError):
+            iCook.load_config({'ICOOK_PRICE_WORKERS': 'many'})
+        with self.assertRaises(iCook.ConfigError):
+            iCook.validate_config(iCook.load_config({}))
+        config = iCook.load_config({'ICOOK_KEY': 'key', 'ICOOK_PREFETCH_PRICES': '1'})
+        self.assertTrue(config['prefetch_prices'])
+        iCook.validate_config(config)
+
+    def test_case_5(self):
+        """Test every app built by create_app keeps calling its own services"""
+        overrides = {'api_key': 'key', 'rate_limit': 0, 'compress': ''}
+        first = iCook.create_app(overrides)
+        second = iCook.create_app(overrides)
+        services = first.server.extensions['icook']
+        self.assertIsNot(services, second.server.extensions['icook'])
+        payload = {'output': 'ingredients-dropdown.options',
+                   'outputs': {'id': 'ingredients-dropdown', 'property': 'options'},
+                   'inputs': [{'id': 'ingredients-dropdown', 'property': 'search_value',
+                               'value': 'eg'}],
+                   'state': [{'id': 'ingredients-dropdown', 'property': 'value', 'value': None},
+                             {'id': 'client-id', 'property': 'data', 'value': 'test'}],
+                   'changedPropIds': ['ingredients-dropdown.search_value']}
+        try:
+            with mock.patch.object(services.ingredient_index, 'search',
+                                   return_value=[{'name': 'egg'}]):
+                response = first.server.test_client().post('/_dash-update-component',
+                                                           json=payload)
+            self.assertEqual(response.get_json()['response']['ingredients-dropdown']['options'],
+                             [{'label': 'Egg', 'value': 'egg'}])
+        finally:
+            for app in (first, second):
+                iCook.shutdown(app.server)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,33 @@
+"""
+Test the local ingredient autocomplete index
+"""
+
+import unittest
+# Import module to be tested
+from ingredient_index import IngredientIndex
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the ingredient index"""
+
+    def setUp(self):
+        self.index = IngredientIndex(['egg yolk', 'Egg', 'hard boiled egg',
+                                      'eggplant', 'flour', 'bread flour'])
+
+    def tearDown(self):
+        pass
+
+    def test_case_1(self):
+        """Test name prefixes rank before later word matches"""
+        self.assertEqual([i['name'] for i in self.index.search('Egg')],
+                         ['egg', 'egg yolk', 'eggplant', 'hard boiled egg'])
+        self.assertEqual(len(self.index.search('egg', number=2)), 2)
+
+    def test_case_2(self):
+        """Test a miss returns no results"""
+        self.assertEqual(self.index.search('zucchini'), [])
+        self.assertEqual(self.index.search(' '), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+Test the latency and payload instrumentation
+"""
+
+import unittest
+# Import module to be tested
+from metrics import Metrics, cache_collector
+from cache import ResponseCache
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the metrics registry"""
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def tearDown(self):
+        pass
+
+    def test_case_1(self):
+        """Test timed calls are rendered as a Prometheus histogram"""
+        @self.metrics.timed('icook_callback_seconds', callback='search')
+        def search():
+            return 'done'
+
+        self.assertEqual(search(), 'done')
+        self.metrics.observe('icook_response_bytes', 2000, (1024, 4096), callback='search')
+        text = self.metrics.render()
+        self.assertIn('# TYPE icook_callback_seconds histogram', text)
+        self.assertIn('icook_callback_seconds_count{callback="search"} 1', text)
+        self.assertIn('icook_response_bytes_bucket{callback="search",le="1024"} 0', text)
+        self.assertIn('icook_response_bytes_bucket{callback="search",le="4096"} 1', text)
+
+    def test_case_2(self):
+        """Test the cache counters are exposed"""
+        responses = ResponseCache()
+        responses.get('autocomplete', 'egg')
+        self.metrics.add_collector(cache_collector(responses))
+        text = self.metrics.render()
+        self.assertIn('icook_cache_misses_total{endpoint="autocomplete"} 1', text)
+        self.assertIn('icook_cache_entries 0', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
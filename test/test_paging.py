@@ -0,0 +1,58 @@
+"""
+Test recipe search results fetched a page at a time
+"""
+
+import unittest
+from unittest import mock
+# Import module to be tested
+from paging import RecipePager
+from recipes import Recipe
+from session_store import make_session_store
+
+
+def find_by_ingredients(available):
+    """A search returning the first number of available recipes"""
+    def find(ingredients, number, priority=None):
+        return [Recipe(i, f'Recipe {i}', None) for i in range(min(number, available))]
+    return find
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the recipe pager"""
+
+    def make_pager(self, available):
+        self.client = mock.Mock()
+        self.client.find_by_ingredients.side_effect = find_by_ingredients(available)
+        return RecipePager(self.client, make_session_store(), page_size=3, margin=1)
+
+    def test_case_1(self):
+        """Test a search fetches one page and the next is fetched near its end"""
+        pager = self.make_pager(100)
+        token, session = pager.start(['egg'])
+        self.assertEqual([r.id for r in session['recipes']], [0, 1, 2])
+        session, index = pager.next(token, session, 0)
+        self.assertEqual(index, 1)
+        # One recipe left, the next page is on its way
+        pager.shutdown(wait=True)
+        session = pager.get(token)
+        self.assertEqual([r.id for r in session['recipes']], [0, 1, 2, 3, 4, 5])
+        self.assertEqual([c.kwargs['number'] for c in
+                          self.client.find_by_ingredients.call_args_list], [3, 6])
+
+    def test_case_2(self):
+        """Test skipping past the last recipe waits for a page then wraps"""
+        pager = self.make_pager(4)
+        pager.margin = -1
+        token, session = pager.start(['egg'])
+        session, index = pager.next(token, session, 2)
+        self.assertEqual(index, 3)
+        self.assertEqual(len(session['recipes']), 4)
+        self.assertTrue(session['exhausted'])
+        session, index = pager.next(token, session, 3)
+        self.assertEqual(index, 0)
+        self.assertEqual(self.client.find_by_ingredients.call_count, 2)
+        pager.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+"""
+Test the background recipe prefetcher
+"""
+
+import threading
+import unittest
+from unittest import mock
+# Import module to be tested
+from prefetch import Prefetcher
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the prefetcher"""
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.prefetcher = Prefetcher(self.client, prices=True)
+
+    def tearDown(self):
+        self.prefetcher.shutdown()
+
+    def test_case_1(self):
+        """Test instructions and prices are requested once per recipe"""
+        # Hold the workers so the duplicate id is still pending
+        release = threading.Event()
+        self.client.analyzed_instructions.side_effect = lambda recipe_id, priority: release.wait(5)
+        self.prefetcher.prefetch([1, 2])
+        self.prefetcher.prefetch([2])
+        release.set()
+        self.prefetcher.shutdown(wait=True)
+        self.assertEqual(sorted(c.args[0] for c in
+                                self.client.analyzed_instructions.call_args_list), [1, 2])
+        self.assertEqual(self.client.price_breakdown.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
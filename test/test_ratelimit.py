@@ -0,0 +1,124 @@
+"""
+Test the spoonacular request budget
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+# Import module to be tested
+import ratelimit
+from cache import ResponseCache
+from spoonacular import BudgetExceeded, SpoonacularClient
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the rate limiter"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_case_1(self):
+        """Test lower priorities leave part of the bucket to higher ones"""
+        limiter = ratelimit.RateLimiter(rate=0.001, burst=4, max_wait=0)
+        # Prefetches stop once half the bucket is used
+        self.assertTrue(limiter.acquire(ratelimit.PREFETCH))
+        self.assertTrue(limiter.acquire(ratelimit.PREFETCH))
+        self.assertFalse(limiter.acquire(ratelimit.PREFETCH))
+        # Prices leave a quarter
+        self.assertTrue(limiter.acquire(ratelimit.PRICE))
+        self.assertFalse(limiter.acquire(ratelimit.PRICE))
+        self.assertTrue(limiter.acquire(ratelimit.INTERACTIVE))
+        self.assertFalse(limiter.acquire(ratelimit.INTERACTIVE))
+        self.assertEqual(limiter.refused, {'prefetch': 1, 'price': 1, 'interactive': 1})
+
+    def test_case_2(self):
+        """Test the quota reserve and the bucket are shared through SQLite"""
+        first = ratelimit.RateLimiter(rate=0.001, burst=10, quota_reserve=5, path=self.path)
+        second = ratelimit.RateLimiter(rate=0.001, burst=10, quota_reserve=5, path=self.path)
+        first.record_quota(8)
+        self.assertEqual(second.quota_left(), 8)
+        # 8 points left are within twice the reserve, and above the reserve
+        self.assertFalse(second.acquire(ratelimit.PREFETCH))
+        self.assertTrue(second.acquire(ratelimit.PRICE))
+        first.record_quota(2)
+        self.assertFalse(second.acquire(ratelimit.PRICE))
+        self.assertTrue(second.acquire(ratelimit.INTERACTIVE))
+        # Two tokens were taken from the shared bucket
+        for _ in range(8):
+            self.assertTrue(first.acquire(ratelimit.INTERACTIVE))
+        first.max_wait = 0
+        self.assertFalse(first.acquire(ratelimit.INTERACTIVE))
+
+    def test_case_3(self):
+        """Test a refused request is answered from stale cache data"""
+        limiter = ratelimit.RateLimiter(rate=0.001, burst=1, max_wait=0)
+        responses = ResponseCache(ttls={'priceBreakdown': -1})
+        responses.set('priceBreakdown', 'priceBreakdown:1', {'ingredients': []})
+        client = SpoonacularClient('key', cache=responses, limiter=limiter)
+        with mock.patch.object(client.session, 'get') as get:
+            self.assertTrue(limiter.acquire())
+            self.assertEqual(client.price_breakdown(1), {'ingredients': []})
+            with self.assertRaises(BudgetExceeded):
+                client.price_breakdown(2)
+        get.assert_not_called()
+        self.assertEqual(responses.stats()['priceBreakdown']['stale'], 1)
+        client.session.close()
+
+    def test_case_4(self):
+        """Test every retry of a throttled request needs a token"""
+        limiter = ratelimit.RateLimiter(rate=0.001, burst=2, max_wait=0)
+        client = SpoonacularClient('key', retries=3, backoff=0, limiter=limiter)
+        throttled = mock.Mock(status_code=429, headers={})
+        with mock.patch.object(client.session, 'get', return_value=throttled) as get:
+            with self.assertRaises(BudgetExceeded):
+                client.analyzed_instructions(1)
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(limiter.refused, {'interactive': 1})
+        client.session.close()
+
+    def test_case_5(self):
+        """Test an interactive caller joining a refused prefetch makes its own call"""
+        limiter = ratelimit.RateLimiter(rate=0.001, burst=2, max_wait=0)
+        client = SpoonacularClient('key', retries=1, backoff=0, limiter=limiter)
+        joined = threading.Event()
+        failed = mock.Mock(status_code=503, headers={})
+        steps = mock.Mock(status_code=200, headers={}, json=lambda: [{'steps': []}])
+
+        def get(url, params, timeout):
+            if not joined.is_set():
+                joined.wait(5)
+                return failed
+            return steps
+
+        outcomes = []
+
+        def prefetch():
+            try:
+                client.analyzed_instructions(1, priority=ratelimit.PREFETCH)
+            except BudgetExceeded as refused:
+                outcomes.append(refused)
+
+        with mock.patch.object(client.session, 'get', side_effect=get) as sent:
+            thread = threading.Thread(target=prefetch)
+            thread.start()
+            while client.flights.in_flight() == 0:
+                time.sleep(0.01)
+            # The interactive call waits on the prefetch, whose retry is refused
+            threading.Timer(0.2, joined.set).start()
+            self.assertEqual(client.analyzed_instructions(1), [{'steps': []}])
+            thread.join()
+        self.assertEqual(client.flights.shared, 1)
+        self.assertEqual(outcomes[0].priority, ratelimit.PREFETCH)
+        self.assertEqual(sent.call_count, 2)
+        client.session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
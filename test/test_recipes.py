@@ -0,0 +1,40 @@
+"""
+Test the compact recipe records
+"""
+
+import pickle
+import unittest
+# Import module to be tested
+from recipes import MissedIngredient, Recipe, compact_recipes
+from test.mock_spoonacular import find_by_ingredients
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the recipe projection"""
+
+    def test_case_1(self):
+        """Test a search response keeps only the rendered fields"""
+        response = find_by_ingredients({'ingredients': ['egg,flour'], 'number': ['2']})
+        recipe = compact_recipes(response)[0]
+        data = response[0]
+        self.assertEqual((recipe.id, recipe.title, recipe.image, recipe.missed_count),
+                         (data['id'], data['title'], data['image'],
+                          data['missedIngredientCount']))
+        self.assertEqual(recipe.used_images, tuple(n['image'] for n in data['usedIngredients']))
+        missed = data['missedIngredients'][0]
+        self.assertEqual(recipe.missed[0].to_dict(recipe.id),
+                         {'name': missed['name'], 'id': missed['id'], 'aisle': missed['aisle'],
+                          'amount': missed['amount'], 'unit': missed['unit'],
+                          'recipe_id': recipe.id})
+        self.assertFalse(hasattr(recipe, '__dict__'))
+
+    def test_case_2(self):
+        """Test records survive the pickling of the cache and session store"""
+        recipe = Recipe(1, 'Pie', 'pie.jpg', ['egg.jpg'],
+                        [MissedIngredient(2, 'flour', 'Baking', 1.5, 'cups')], 1)
+        self.assertEqual(pickle.loads(pickle.dumps(recipe, pickle.HIGHEST_PROTOCOL)), recipe)
+        self.assertNotEqual(Recipe(1, 'Pie', 'pie.jpg'), recipe)
+
+
+if __name__ == '__main__':
+    unittest.main()
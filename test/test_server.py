@@ -0,0 +1,91 @@
+"""
+Test the pooled server and health check
+"""
+
+import os
+import runpy
+import signal
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import requests
+from flask import Flask
+# Import module to be tested
+import server
+
+
+class TestTemplate(unittest.TestCase):
+    """Test serving a Flask app on the thread pool"""
+
+    def setUp(self):
+        app = Flask(__name__)
+        server.add_health_check(app)
+        self.httpd = server.PooledWSGIServer('127.0.0.1', 0, app, threads=2)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/healthz'
+
+    def tearDown(self):
+        server.draining.clear()
+        self.httpd.shutdown()
+        self.httpd.pool.shutdown(wait=True)
+        self.httpd.server_close()
+
+    def test_case_1(self):
+        """Test /healthz reports ok and then draining"""
+        response = requests.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok'})
+        server.draining.set()
+        self.assertEqual(requests.get(self.url).status_code, 503)
+
+    def test_case_2(self):
+        """Test responses are compressed with an algorithm the browser accepts"""
+        app = Flask(__name__)
+        algorithms = server.add_compression(app, ['br', 'gzip'], min_size=10)
+
+        @app.route('/data')
+        def data():
+            return {'steps': ['mix the flour and eggs'] * 50}
+
+        client = app.test_client()
+        response = client.get('/data', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        response = client.get('/data', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], algorithms[0])
+        self.assertNotIn('Content-Encoding', client.get('/data').headers)
+
+    def test_case_3(self):
+        """Test gunicorn workers share their stores and drain on SIGTERM"""
+        conf_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'gunicorn.conf.py')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shared_dir = os.path.join(tmpdir, 'icook')
+            with mock.patch.dict(os.environ, {'ICOOK_WORKERS': '3',
+                                              'ICOOK_SHARED_DIR': shared_dir}):
+                os.environ.pop('ICOOK_SESSION_URL', None)
+                os.environ.pop('ICOOK_CACHE_PATH', None)
+                conf = runpy.run_path(conf_path)
+                self.assertEqual(os.environ['ICOOK_SESSION_URL'],
+                                 os.path.join(shared_dir, 'icook-sessions.db'))
+                self.assertEqual(os.environ['ICOOK_CACHE_PATH'],
+                                 os.path.join(shared_dir, 'icook-cache.db'))
+            self.assertEqual(os.stat(shared_dir).st_mode & 0o777, 0o700)
+            # Files others can plant are never unpickled
+            os.chmod(tmpdir, 0o777)
+            with self.assertRaises(RuntimeError):
+                conf['private_dir'](tmpdir)
+        exits = []
+        handler = signal.signal(signal.SIGTERM, lambda signum, frame: exits.append(signum))
+        try:
+            conf['post_worker_init'](None)
+            os.kill(os.getpid(), signal.SIGTERM)
+        finally:
+            signal.signal(signal.SIGTERM, handler)
+        self.assertTrue(server.draining.is_set())
+        self.assertEqual(exits, [signal.SIGTERM])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Test the server side search session store
+"""
+
+import os
+import tempfile
+import unittest
+# Import module to be tested
+import session_store
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the session store"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_case_1(self):
+        """Test stored results are returned for their token only"""
+        store = session_store.make_session_store()
+        token = store.create([{'id': 1}])
+        self.assertEqual(store.get(token), [{'id': 1}])
+        self.assertIsNone(store.get('unknown'))
+        self.assertIsNone(store.get(None))
+
+    def test_case_2(self):
+        """Test SQLite sessions are shared and expire"""
+        path = os.path.join(self.tmpdir.name, 'sessions.db')
+        token = session_store.make_session_store(path).create([{'id': 1}])
+        self.assertEqual(session_store.make_session_store(path).get(token), [{'id': 1}])
+        expired = session_store.make_session_store(path, ttl=-1)
+        self.assertIsNone(expired.get(expired.create([{'id': 2}])))
+
+    def test_case_3(self):
+        """Test expired SQLite sessions are deleted"""
+        path = os.path.join(self.tmpdir.name, 'sessions.db')
+        expired = session_store.make_session_store(path, ttl=-1)
+        expired.create([{'id': 1}])
+        expired.create([{'id': 2}])
+        store = session_store.make_session_store(path)
+        token = store.create([{'id': 3}])
+        self.assertEqual(len(store.backend), 1)
+        self.assertEqual(store.get(token), [{'id': 3}])
+
+
+if __name__ == '__main__':
+    unittest.main()
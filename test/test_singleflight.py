@@ -0,0 +1,103 @@
+"""
+Test the single-flight call coalescing
+"""
+
+import threading
+import unittest
+from unittest import mock
+# Import module to be tested
+from singleflight import SingleFlight
+
+
+class TestTemplate(unittest.TestCase):
+    """Test single-flight calls"""
+
+    def run_concurrently(self, flights, func, count=4):
+        """Call flights.do('key', func) from count threads while func is
+        held, return the results and exceptions"""
+        outcomes = []
+
+        def call():
+            try:
+                outcomes.append(flights.do('key', func))
+            except ValueError as err:
+                outcomes.append(err)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_case_1(self):
+        """Test concurrent callers share the result of one call"""
+        flights = SingleFlight()
+        release = threading.Event()
+        func = mock.Mock(side_effect=lambda: release.wait(5) and 'recipe')
+        # Answer once every other caller is waiting on the call
+        threading.Timer(0.2, release.set).start()
+        self.assertEqual(self.run_concurrently(flights, func), ['recipe'] * 4)
+        self.assertEqual(func.call_count, 1)
+        self.assertEqual(flights.shared, 3)
+        self.assertEqual(flights.in_flight(), 0)
+
+        # A call made once the first finished runs again
+        self.assertEqual(flights.do('key', func), 'recipe')
+        self.assertEqual(func.call_count, 2)
+
+    def test_case_2(self):
+        """Test the exception of the call is raised to every caller"""
+        flights = SingleFlight()
+        release = threading.Event()
+
+        def func():
+            release.wait(5)
+            raise ValueError('upstream failed')
+
+        threading.Timer(0.2, release.set).start()
+        outcomes = self.run_concurrently(flights, func)
+        self.assertEqual(len(outcomes), 4)
+        self.assertTrue(all(isinstance(o, ValueError) for o in outcomes))
+
+    def test_case_3(self):
+        """Test waiters make the call again when its caller is interrupted"""
+        class Interrupted(BaseException):
+            pass
+
+        flights = SingleFlight()
+        release = threading.Event()
+        again = threading.Event()
+        calls = []
+
+        def func():
+            calls.append(threading.current_thread())
+            if len(calls) == 1:
+                release.wait(5)
+                raise Interrupted()
+            again.wait(5)
+            return 'recipe'
+
+        outcomes = []
+
+        def call():
+            try:
+                outcomes.append(flights.do('key', func))
+            except Interrupted as err:
+                outcomes.append(err)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        threading.Timer(0.2, release.set).start()
+        threading.Timer(0.4, again.set).start()
+        for thread in threads:
+            thread.join()
+        # The second call is shared by the other waiter
+        self.assertEqual(sorted(map(str, outcomes)), ['', 'recipe', 'recipe'])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flights.in_flight(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Test the shared spoonacular client retry and quota handling
+"""
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+# Import module to be tested
+import spoonacular
+from cache import ResponseCache
+from recipes import Recipe
+from test.mock_spoonacular import start_mock_server
+
+
+def fake_response(status, body=None, headers=None):
+    """Build a stand in for a requests response"""
+    response = mock.Mock(status_code=status, headers=headers or {})
+    response.json.return_value = body
+    if status >= 400:
+        response.raise_for_status.side_effect = spoonacular.requests.HTTPError(str(status))
+    return response
+
+
+class TestTemplate(unittest.TestCase):
+    """Test the spoonacular client"""
+
+    def setUp(self):
+        self.client = spoonacular.SpoonacularClient('key', backoff=0)
+
+    def tearDown(self):
+        self.client.session.close()
+
+    def test_case_1(self):
+        """Test a throttled request is retried and quota headers are kept"""
+        responses = [fake_response(429),
+                     fake_response(200, [{'name': 'egg'}],
+                                   {'X-API-Quota-Left': '149.5'})]
+        with mock.patch.object(self.client.session, 'get', side_effect=responses) as get:
+            self.assertEqual(self.client.autocomplete_ingredients('egg'),
+                             [{'name': 'egg'}])
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(self.client.quota['left'], 149.5)
+
+    def test_case_2(self):
+        """Test a request failing on every attempt raises HTTPError"""
+        with mock.patch.object(self.client.session, 'get',
+                               return_value=fake_response(503)) as get:
+            with self.assertRaises(spoonacular.requests.HTTPError):
+                self.client.analyzed_instructions(1)
+        self.assertEqual(get.call_count, self.client.retries + 1)
+
+    def test_case_3(self):
+        """Test identical searches in any order are answered from the cache"""
+        self.client.cache = ResponseCache()
+        with mock.patch.object(self.client.session, 'get',
+                               return_value=fake_response(200, [{'id': 1, 'title': 'Pie'}])) as get:
+            self.client.find_by_ingredients(['flour', 'Egg'])
+            self.assertEqual(self.client.find_by_ingredients(['egg', 'flour']),
+                             [Recipe(1, 'Pie', None)])
+        self.assertEqual(get.call_count, 1)
+
+    def test_case_4(self):
+        """Test every endpoint against the mock spoonacular server"""
+        server, url = start_mock_server()
+        client = spoonacular.SpoonacularClient('key', base_url=url)
+        try:
+            recipes = client.find_by_ingredients(['egg', 'flour'], number=3)
+            self.assertEqual(len(recipes), 3)
+            self.assertTrue(client.analyzed_instructions(recipes[0].id)[0]['steps'])
+            missed = recipes[0].missed[0]
+            info = client.ingredient_information(missed.id, amount=2)
+            self.assertEqual(info['estimatedCost']['value'], 51.0)
+            self.assertTrue(client.price_breakdown(recipes[0].id)['ingredients'])
+            self.assertIn({'name': 'egg', 'image': 'egg.jpg'},
+                          client.autocomplete_ingredients('egg'))
+            self.assertEqual(client.quota['used'], 5)
+        finally:
+            client.session.close()
+            server.shutdown()
+
+    def test_case_5(self):
+        """Test concurrent identical requests reach the server once"""
+        server, url = start_mock_server(latency=0.2)
+        client = spoonacular.SpoonacularClient('key', base_url=url)
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(client.analyzed_instructions, [7] * 8))
+            self.assertEqual(server.requests, 1)
+            self.assertEqual(client.flights.shared, 7)
+            self.assertTrue(all(r == results[0] for r in results))
+        finally:
+            client.session.close()
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
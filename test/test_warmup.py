@@ -0,0 +1,122 @@
+"""
+Test the cache warm-up and snapshots
+"""
+
+import os
+import pickle
+import sys
+import tempfile
+import time
+import unittest
+import zlib
+from unittest import mock
+# Import module to be tested
+import snapshot
+import warmup
+from cache import ResponseCache
+from recipes import Recipe
+from spoonacular import SpoonacularClient
+from test.mock_spoonacular import start_mock_server
+
+
+class Gone(object):
+    """A cached value whose class is removed in a later deploy"""
+
+
+class TestTemplate(unittest.TestCase):
+    """Test warming the cache and writing snapshots"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.snap')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_case_1(self):
+        """Test a snapshot restores the fresh entries with their expiry"""
+        responses = ResponseCache(ttls={'autocomplete': -1})
+        responses.set('findByIngredients', 'findByIngredients:egg', [Recipe(1, 'Pie', None)])
+        responses.set('autocomplete', 'autocomplete:egg', [{'name': 'egg'}])
+        self.assertEqual(snapshot.write_snapshot(self.path, responses.entries()), 1)
+
+        restored = ResponseCache()
+        self.assertEqual(restored.restore(snapshot.read_snapshot(self.path)), 1)
+        self.assertEqual(restored.get('findByIngredients', 'findByIngredients:egg'),
+                         [Recipe(1, 'Pie', None)])
+        self.assertEqual(restored.memory.get('findByIngredients:egg')[0],
+                         responses.memory.get('findByIngredients:egg')[0])
+
+        with open(self.path, 'wb') as damaged:
+            damaged.write(b'not a snapshot')
+        with self.assertRaises(ValueError):
+            list(snapshot.read_snapshot(self.path))
+
+    def test_case_2(self):
+        """Test warming fetches searches and the details of their recipes"""
+        server, url = start_mock_server()
+        client = SpoonacularClient('key', base_url=url, cache=ResponseCache())
+        try:
+            failed = warmup.warm(client, [['egg', 'flour']], [7], number=2, prices=True,
+                                 workers=2)
+            self.assertEqual(failed, 0)
+            # One search, then instructions and prices of 3 recipes
+            self.assertEqual(server.requests, 7)
+            self.assertEqual(len(client.cache.entries()), 7)
+            client.find_by_ingredients(['flour', 'egg'], number=2)
+            client.price_breakdown(7)
+            self.assertEqual(server.requests, 7)
+        finally:
+            client.session.close()
+            server.shutdown()
+        self.assertGreater(min(e[1] for e in client.cache.entries()), time.time())
+
+    def test_case_3(self):
+        """Test a warm-up into a snapshot keeps more responses than the cache size"""
+        server, url = start_mock_server()
+        searches = os.path.join(self.tmpdir.name, 'searches.txt')
+        with open(searches, 'w') as lines:
+            lines.write('egg, flour\n')
+        env = {'ICOOK_KEY': 'key', 'ICOOK_API_URL': url, 'ICOOK_RATE_LIMIT': '0',
+               'ICOOK_CACHE_SIZE': '2'}
+        try:
+            with mock.patch.dict(os.environ, env):
+                os.environ.pop('ICOOK_CACHE_PATH', None)
+                with self.assertRaises(SystemExit) as exited:
+                    warmup.main(['warm', '--searches', searches, '--number', '3',
+                                 '--snapshot', self.path])
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(exited.exception.code, 0)
+        # One search and the instructions of its 3 recipes
+        self.assertEqual(len(list(snapshot.read_snapshot(self.path))), 4)
+
+
+    def test_case_4(self):
+        """Test values that no longer unpickle are skipped and damage is a ValueError"""
+        expires = time.time() + 60
+        snapshot.write_snapshot(self.path, [('gone', expires, Gone()), ('egg', expires, [1])])
+        gone = Gone
+        module = sys.modules[gone.__module__]
+        del module.Gone
+        try:
+            self.assertEqual(list(snapshot.read_snapshot(self.path)), [('egg', expires, [1])])
+        finally:
+            module.Gone = gone
+
+        with open(self.path, 'rb') as complete:
+            header = complete.read(len(snapshot.MAGIC) + 1)
+            data = zlib.decompress(complete.read())
+        last = len(data) - snapshot.RECORD.size - len('egg') - \
+            len(pickle.dumps([1], pickle.HIGHEST_PROTOCOL))
+        # Cut inside the last value and inside the last record header
+        for size in (len(data) - 2, last + 5):
+            with open(self.path, 'wb') as truncated:
+                truncated.write(header + zlib.compress(data[:size]))
+            with self.assertRaises(ValueError):
+                list(snapshot.read_snapshot(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Warm up, dump and restore the iCook response cache
+
+New workers start with an empty cache and the first users of a deploy
+would all wait on spoonacular. Popular searches and recipes can be
+fetched ahead of time into the shared cache (ICOOK_CACHE_PATH) or into
+a snapshot, and snapshots restored into the shared cache or loaded by
+every worker at startup with ICOOK_CACHE_SNAPSHOT.
+
+    $ ICOOK_KEY=... ICOOK_CACHE_PATH=cache.db python warmup.py warm \\
+          --searches popular-searches.txt --recipes popular-recipes.txt
+    $ ICOOK_CACHE_PATH=cache.db python warmup.py dump cache.snap
+    $ ICOOK_CACHE_PATH=cache.db python warmup.py restore cache.snap
+
+The settings are read from the environment like iCook.py, a searches
+file has a comma separated list of ingredients on each line and a
+recipes file a recipe id on each line.
+"""
+
+import argparse
+# We will log to terminal warm-up progress
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from sys import exit
+
+from requests.exceptions import RequestException
+
+from iCook import ConfigError, load_config, make_client, validate_config
+from ratelimit import PREFETCH
+from snapshot import read_snapshot, write_snapshot
+
+
+def read_lines(path):
+    """Return the lines of path that are not blank or comments"""
+    with open(path) as lines:
+        return [line.strip() for line in lines if line.strip() and not line.startswith('#')]
+
+
+def warm(client, searches, recipe_ids, number, prices, workers):
+    """warm
+    --
+    Fetch the recipes of each search, then the instructions (and price
+    breakdowns with prices) of the recipes found and of recipe_ids
+    return: the number of requests that failed
+    """
+    failed = 0
+    recipe_ids = list(recipe_ids)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(client.find_by_ingredients, ingredients, number, PREFETCH)
+                   for ingredients in searches]
+        for ingredients, future in zip(searches, futures):
+            try:
+                recipe_ids.extend(r.id for r in future.result())
+            except RequestException as http_err:
+                logging.error(f"Search for {','.join(ingredients)} failed: {http_err}")
+                failed += 1
+
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        futures = [executor.submit(client.analyzed_instructions, recipe_id, PREFETCH)
+                   for recipe_id in recipe_ids]
+        if prices:
+            futures += [executor.submit(client.price_breakdown, recipe_id, PREFETCH)
+                        for recipe_id in recipe_ids]
+        for future in futures:
+            try:
+                future.result()
+            except RequestException as http_err:
+                logging.error(f'Recipe details failed: {http_err}')
+                failed += 1
+    logging.info(f'Warmed {len(searches)} searches and {len(recipe_ids)} recipes, '
+                 f'{failed} requests failed, quota {client.quota or "unknown"}')
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    warm_parser = commands.add_parser('warm', help='fetch popular searches and recipes')
+    warm_parser.add_argument('--searches', help='file of comma separated ingredient lists')
+    warm_parser.add_argument('--recipes', help='file of recipe ids')
+    warm_parser.add_argument('--number', type=int,
+                             help='recipes per search, the search page size by default')
+    warm_parser.add_argument('--prices', action='store_true',
+                             help='also fetch the price breakdowns of the recipes')
+    warm_parser.add_argument('--workers', type=int, default=4)
+    warm_parser.add_argument('--snapshot', help='also write the warm cache to this snapshot')
+    dump_parser = commands.add_parser('dump', help='write the shared cache to a snapshot')
+    dump_parser.add_argument('snapshot')
+    restore_parser = commands.add_parser('restore',
+                                         help='load a snapshot into the shared cache')
+    restore_parser.add_argument('snapshot')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    config = load_config()
+    # Dump and restore never call spoonacular
+    if args.command != 'warm':
+        config['api_key'] = config['api_key'] or 'unused'
+    try:
+        validate_config(config)
+    except ConfigError as err:
+        logging.error(err)
+        exit(1)
+    if not config['cache_path'] and (args.command != 'warm' or not args.snapshot):
+        logging.error('Set ICOOK_CACHE_PATH to the shared cache file'
+                      + (' or give --snapshot' if args.command == 'warm' else ''))
+        exit(1)
+    if args.command == 'warm' and not config['cache_path']:
+        # The snapshot is written from memory, every response is kept
+        config['cache_size'] = None
+    client = make_client(config)
+    if client.limiter is not None:
+        # Warm-up runs at prefetch priority and waits for its turn
+        client.limiter.background_wait = 60
+
+    if args.command == 'warm':
+        searches = [[i.strip() for i in line.split(',')]
+                    for line in (read_lines(args.searches) if args.searches else [])]
+        recipe_ids = [int(line) for line in (read_lines(args.recipes) if args.recipes else [])]
+        failed = warm(client, searches, recipe_ids, args.number or config['recipe_page'],
+                      args.prices, args.workers)
+        if args.snapshot:
+            count = write_snapshot(args.snapshot, client.cache.entries())
+            logging.info(f'Wrote {count} cached responses to {args.snapshot}')
+        exit(1 if failed else 0)
+    elif args.command == 'dump':
+        count = write_snapshot(args.snapshot, client.cache.entries())
+        logging.info(f'Wrote {count} cached responses to {args.snapshot}')
+    else:
+        try:
+            count = client.cache.restore(read_snapshot(args.snapshot))
+        except (OSError, ValueError) as err:
+            logging.error(f'Could not restore {args.snapshot}: {err}')
+            exit(1)
+        logging.info(f'Restored {count} cached responses from {args.snapshot}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""
+WSGI entry point for gunicorn and other WSGI servers
+
+    $ gunicorn -c gunicorn.conf.py wsgi:application
+"""
+
+# We will log to terminal configuration errors
+import logging
+from sys import exit
+
+from iCook import ConfigError, create_app
+
+
+def create_application(config=None):
+    """Return the Flask server underneath a new Dash app, the worker
+    exits when the configuration is unusable"""
+    try:
+        return create_app(config).server
+    except ConfigError as err:
+        logging.error(err)
+        exit(1)
+
+
+application = create_application()